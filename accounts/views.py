@@ -16,6 +16,7 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
 from orders.models import Order
+from cart.guest import TOKEN_HEADER as GUEST_CART_TOKEN_HEADER, merge_guest_cart
 from cart.models import Cart
 from wishlist.models import Wishlist
 from django.db.models import Sum, Count
@@ -78,6 +79,16 @@ class LoginView(APIView):
                 if user.is_active:
                     # Generate tokens
                     refresh = RefreshToken.for_user(user)
+
+                    # Move the visitor's guest cart (if any) into their cart. A failed
+                    # merge must not fail the login; the guest cart is kept for a retry
+                    try:
+                        merged = merge_guest_cart(
+                            user, request.headers.get(GUEST_CART_TOKEN_HEADER) or request.data.get('cart_token')
+                        )
+                    except Exception as e:
+                        print(f"Merging guest cart failed for user {user.id}: {e}")
+                        merged = {'merged': 0, 'dropped': [], 'failed': True}
                     
                     # User data - match frontend expectations
                     user_data = {
@@ -96,7 +107,10 @@ class LoginView(APIView):
                         "message": "Login successful",
                         "access": str(refresh.access_token),
                         "refresh": str(refresh),
-                        "user": user_data
+                        "user": user_data,
+                        "merged_cart_items": merged['merged'],
+                        "dropped_cart_products": merged['dropped'],
+                        "cart_merge_failed": merged.get('failed', False),
                     }, status=status.HTTP_200_OK)
                 else:
                     return Response({
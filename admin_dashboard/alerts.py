@@ -0,0 +1,76 @@
+"""
+Low-stock alerts for the admin dashboard.
+
+generate_low_stock_alerts() is meant to run on a schedule (see the
+generate_low_stock_alerts management command). It reads every live
+product at or below LOW_STOCK_THRESHOLD with one indexed query, skips
+products an admin still has an unread alert of the same level for, and
+writes the remaining notifications for all admins with one bulk_create.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from products.models import Product
+
+from .models import DashboardNotification
+
+LOW_STOCK_TITLE = 'Low stock'
+CRITICAL_STOCK_TITLE = 'Critically low stock'
+OUT_OF_STOCK_TITLE = 'Out of stock'
+ALERT_TITLES = (LOW_STOCK_TITLE, CRITICAL_STOCK_TITLE, OUT_OF_STOCK_TITLE)
+
+
+def stock_alert(stock, critical_threshold):
+    """(title, priority) for a product's stock level"""
+    if stock <= critical_threshold:
+        return OUT_OF_STOCK_TITLE if stock <= 0 else CRITICAL_STOCK_TITLE, 'critical'
+    return LOW_STOCK_TITLE, 'high'
+
+
+def generate_low_stock_alerts(low_threshold=None, critical_threshold=None):
+    if low_threshold is None:
+        low_threshold = settings.LOW_STOCK_THRESHOLD
+    if critical_threshold is None:
+        critical_threshold = settings.CRITICAL_STOCK_THRESHOLD
+
+    products = list(
+        Product.objects.filter(stock__lte=low_threshold)
+        .order_by('stock', 'id')
+        .values_list('id', 'name', 'stock')
+    )
+    if not products:
+        return {'products': 0, 'created': 0}
+
+    admins = list(
+        get_user_model().objects.filter(Q(is_staff=True) | Q(role='admin'), is_active=True)
+        .values_list('id', flat=True)
+    )
+    # Unread alerts of the same level are still open; a drop to critical raises a new one
+    is_stock_alert = Q()
+    for title in ALERT_TITLES:
+        is_stock_alert |= Q(title__startswith=f'{title}:')
+    already_open = set(
+        DashboardNotification.objects.filter(
+            is_stock_alert,
+            is_read=False,
+            related_product_id__in=[pk for pk, _, _ in products],
+            admin_user_id__in=admins,
+        ).values_list('admin_user_id', 'related_product_id', 'priority')
+    )
+
+    notifications = []
+    for pk, name, stock in products:
+        title, priority = stock_alert(stock, critical_threshold)
+        for admin_id in admins:
+            if (admin_id, pk, priority) in already_open:
+                continue
+            notifications.append(DashboardNotification(
+                admin_user_id=admin_id,
+                title=f'{title}: {name}',
+                message=f'"{name}" has {stock} unit{"" if stock == 1 else "s"} left in stock.',
+                priority=priority,
+                related_product_id=pk,
+            ))
+    DashboardNotification.objects.bulk_create(notifications, batch_size=1000)
+    return {'products': len(products), 'created': len(notifications)}
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from admin_dashboard.alerts import generate_low_stock_alerts
+
+
+class Command(BaseCommand):
+    help = 'Creates dashboard notifications for every admin about products that are low on or out of stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int, help='Defaults to LOW_STOCK_THRESHOLD')
+        parser.add_argument('--critical-threshold', type=int, help='Defaults to CRITICAL_STOCK_THRESHOLD')
+
+    def handle(self, *args, **options):
+        result = generate_low_stock_alerts(
+            low_threshold=options['threshold'],
+            critical_threshold=options['critical_threshold'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['products']} products low on stock, {result['created']} notifications created"
+        ))
@@ -1,3 +1,50 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from products.models import Product
+from .alerts import generate_low_stock_alerts
+from .models import DashboardNotification
+
+User = get_user_model()
+
+
+class LowStockAlertTests(TestCase):
+    def setUp(self):
+        self.admins = [
+            User.objects.create_user(username=f'admin{i}', email=f'admin{i}@example.com', password='pw', is_staff=True)
+            for i in range(2)
+        ]
+        User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        Product.objects.create(name='Plenty', price='1.00', stock=10)
+        self.low = Product.objects.create(name='Wheel', price='1.00', stock=3)
+        self.out = Product.objects.create(name='Horn', price='1.00', stock=0)
+        Product.objects.create(name='Old', price='1.00', stock=0).soft_delete()
+
+    def alerts(self):
+        return sorted(DashboardNotification.objects.values_list('related_product_id', 'title', 'priority'))
+
+    def test_one_alert_per_admin_and_product(self):
+        # Products, admins, open alerts, one bulk insert
+        with self.assertNumQueries(4):
+            result = generate_low_stock_alerts(low_threshold=5, critical_threshold=0)
+        self.assertEqual(result, {'products': 2, 'created': 4})
+        self.assertEqual(sorted(set(self.alerts())), [
+            (self.low.id, 'Low stock: Wheel', 'high'),
+            (self.out.id, 'Out of stock: Horn', 'critical'),
+        ])
+        self.assertEqual(
+            set(DashboardNotification.objects.values_list('admin_user_id', flat=True)), {a.id for a in self.admins}
+        )
+
+    def test_open_alerts_are_not_repeated(self):
+        generate_low_stock_alerts(low_threshold=5, critical_threshold=0)
+        self.assertEqual(generate_low_stock_alerts(low_threshold=5, critical_threshold=0)['created'], 0)
+
+        DashboardNotification.objects.filter(related_product=self.out, admin_user=self.admins[0]).update(is_read=True)
+        self.assertEqual(generate_low_stock_alerts(low_threshold=5, critical_threshold=0)['created'], 1)
+
+    def test_drop_to_critical_raises_a_new_alert(self):
+        generate_low_stock_alerts(low_threshold=5, critical_threshold=1)
+        Product.objects.filter(pk=self.low.pk).update(stock=1)
+        self.assertEqual(generate_low_stock_alerts(low_threshold=5, critical_threshold=1)['created'], 2)
+        self.assertIn((self.low.id, 'Critically low stock: Wheel', 'critical'), self.alerts())
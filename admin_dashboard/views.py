@@ -71,6 +71,7 @@ class AdminDashboardView(APIView):
             new_users_today = User.objects.filter(date_joined__gte=timezone.now().date()).count()
 
             # ====================== PRODUCT DATA ======================
+            # Catalog figures count live products only; trashed ones are listed at products/trash/
             total_products = Product.objects.count()
             available_products = Product.objects.filter(
                 (Q(quantity__gt=0) | Q(stock__gt=0)),
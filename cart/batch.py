@@ -0,0 +1,81 @@
+"""
+Batch cart updates.
+
+apply_operations() folds a list of set/increment/remove operations into
+the final quantity of each touched line, then writes the difference
+with one bulk_create, one bulk_update and one DELETE ... WHERE id IN,
+and moves the stock holds with reservations.hold_many(). The number of
+statements does not grow with the number of operations.
+"""
+from django.db import transaction
+
+from products.models import Product
+
+from .models import Cart
+from .reservations import InsufficientStock, hold_many, unavailable
+
+
+class UnknownProducts(Exception):
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = product_ids
+
+
+def fold(operations, current):
+    """{product_id: final quantity} after applying `operations` to `current` in order"""
+    quantities = {}
+    for operation in operations:
+        pk = operation['product']
+        if operation['op'] == 'remove':
+            quantities[pk] = 0
+        elif operation['op'] == 'set':
+            quantities[pk] = operation['quantity']
+        else:
+            quantities[pk] = quantities.get(pk, current.get(pk, 0)) + operation['quantity']
+    return {pk: max(quantity, 0) for pk, quantity in quantities.items()}
+
+
+def apply_operations(user, operations):
+    """
+    Apply `operations` (validated CartOperationSerializer data) to the
+    user's cart in one transaction. Raises UnknownProducts for lines that
+    would hold a missing or trashed product and
+    reservations.InsufficientStock if a hold cannot grow; either way
+    nothing is written.
+    """
+    product_ids = {operation['product'] for operation in operations}
+    try:
+        with transaction.atomic():
+            lines = {
+                line.product_id: line for line in Cart.objects.select_for_update()
+                .filter(user=user, product_id__in=product_ids).only('id', 'product_id', 'quantity')
+            }
+            quantities = fold(operations, {pk: line.quantity for pk, line in lines.items()})
+            # Existing lines were checked when added; only new lines need their product looked up
+            wanted = {pk for pk, quantity in quantities.items() if quantity and pk not in lines}
+            if wanted:
+                missing = wanted - set(Product.objects.filter(pk__in=wanted).values_list('pk', flat=True))
+                if missing:
+                    raise UnknownProducts(sorted(missing))
+
+            created, changed, removed = [], [], []
+            for pk, quantity in quantities.items():
+                line = lines.get(pk)
+                if line is None:
+                    if quantity:
+                        created.append(Cart(user=user, product_id=pk, quantity=quantity))
+                elif not quantity:
+                    removed.append(line.pk)
+                elif quantity != line.quantity:
+                    line.quantity = quantity
+                    changed.append(line)
+
+            if removed:
+                Cart.objects.filter(pk__in=removed).delete()
+            Cart.objects.bulk_update(changed, ['quantity'])
+            Cart.objects.bulk_create(created)
+            hold_many(user, quantities)
+    except InsufficientStock:
+        # Rolled back by now, so this reads the stock the batch was checked against
+        raise InsufficientStock(unavailable(user, quantities))
+    return quantities
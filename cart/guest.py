@@ -0,0 +1,280 @@
+"""
+Guest carts for anonymous visitors.
+
+A guest cart is a {product_id: quantity} map kept in a key-value store
+instead of the Cart table, keyed by a random token that the client sends
+back in the X-Cart-Token header. The token is signed, so a client cannot
+guess or forge another visitor's cart key. Reading or changing a guest cart
+never touches the database except to look up the products themselves.
+
+The store is chosen with GUEST_CART_STORE (dotted path) and
+GUEST_CART_LOCATION:
+
+- InMemoryGuestCartStore: one process only (runserver, tests)
+- SQLiteGuestCartStore: an SQLite file shared by local processes
+- RedisGuestCartStore: any Redis-compatible server (needs the `redis` package)
+
+Guest carts expire GUEST_CART_TTL seconds after their last change and a
+line holds at most GUEST_CART_MAX_QUANTITY units. Guests do not hold
+stock. On login, merge_guest_cart() moves the lines into the user's Cart
+with one bulk upsert and then holds their stock.
+"""
+import secrets
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from products.models import Product
+
+from .models import Cart
+from .reservations import InsufficientStock, hold_many, unavailable
+
+TOKEN_HEADER = 'X-Cart-Token'
+TOKEN_SALT = 'cart.guest'
+
+
+def new_token():
+    return signing.Signer(salt=TOKEN_SALT).sign(secrets.token_urlsafe(18))
+
+
+def read_token(token):
+    """The store key inside a signed cart token, or None if it was tampered with"""
+    if not token:
+        return None
+    try:
+        return signing.Signer(salt=TOKEN_SALT).unsign(token)
+    except signing.BadSignature:
+        return None
+
+
+class GuestCartStore:
+    """
+    Interface of a guest cart backend. Keys are store keys (see
+    read_token), carts are {product_id: quantity}; every write restarts
+    the cart's TTL.
+    """
+    def __init__(self, location='', ttl=None):
+        self.location = location
+        self.ttl = settings.GUEST_CART_TTL if ttl is None else ttl
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def add(self, key, product_id, quantity):
+        """Add to a line atomically and return its new quantity"""
+        raise NotImplementedError
+
+    def set(self, key, product_id, quantity):
+        """Set a line's quantity; 0 removes it"""
+        raise NotImplementedError
+
+    def pop(self, key):
+        """Delete a cart and return what it held"""
+        raise NotImplementedError
+
+
+class InMemoryGuestCartStore(GuestCartStore):
+    def __init__(self, location='', ttl=None):
+        super().__init__(location, ttl)
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        cart = self._carts.get(key)
+        if cart is not None and cart[0] <= time.time():
+            del self._carts[key]
+            return None
+        return cart
+
+    def _touch(self, key):
+        cart = self._live(key) or (0, {})
+        self._carts[key] = (time.time() + self.ttl, cart[1])
+        return cart[1]
+
+    def get(self, key):
+        with self._lock:
+            cart = self._live(key)
+            return dict(cart[1]) if cart else {}
+
+    def add(self, key, product_id, quantity):
+        with self._lock:
+            lines = self._touch(key)
+            lines[product_id] = lines.get(product_id, 0) + quantity
+            return lines[product_id]
+
+    def set(self, key, product_id, quantity):
+        with self._lock:
+            lines = self._touch(key)
+            if quantity:
+                lines[product_id] = quantity
+            else:
+                lines.pop(product_id, None)
+
+    def pop(self, key):
+        with self._lock:
+            cart = self._live(key)
+            self._carts.pop(key, None)
+            return cart[1] if cart else {}
+
+
+class SQLiteGuestCartStore(GuestCartStore):
+    """Lines in an SQLite file (GUEST_CART_LOCATION), one connection per thread"""
+    def __init__(self, location='', ttl=None):
+        super().__init__(location or 'guest_carts.sqlite3', ttl)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # Autocommit; writes take the lock up front with BEGIN IMMEDIATE
+            db = sqlite3.connect(self.location, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS guest_cart_line ('
+                'cart TEXT NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL, '
+                'expires_at REAL NOT NULL, PRIMARY KEY (cart, product_id)) WITHOUT ROWID'
+            )
+            # Abandoned carts are dropped whenever a process connects
+            db.execute('DELETE FROM guest_cart_line WHERE expires_at <= ?', (time.time(),))
+            self._local.db = db
+        return db
+
+    def _write(self, key, *statements):
+        db, expires_at = self._db, time.time() + self.ttl
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Expired carts start empty; live ones get their TTL restarted
+            db.execute('DELETE FROM guest_cart_line WHERE cart = ? AND expires_at <= ?', (key, time.time()))
+            results = [db.execute(sql, params).fetchall() for sql, params in statements]
+            db.execute('UPDATE guest_cart_line SET expires_at = ? WHERE cart = ?', (expires_at, key))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return results
+
+    def get(self, key):
+        rows = self._db.execute(
+            'SELECT product_id, quantity FROM guest_cart_line WHERE cart = ? AND expires_at > ?',
+            (key, time.time()),
+        )
+        return dict(rows)
+
+    def add(self, key, product_id, quantity):
+        (rows,) = self._write(key, (
+            'INSERT INTO guest_cart_line (cart, product_id, quantity, expires_at) VALUES (?, ?, ?, 0) '
+            'ON CONFLICT (cart, product_id) DO UPDATE SET quantity = quantity + excluded.quantity '
+            'RETURNING quantity',
+            (key, product_id, quantity),
+        ))
+        return rows[0][0]
+
+    def set(self, key, product_id, quantity):
+        if quantity:
+            self._write(key, (
+                'INSERT INTO guest_cart_line (cart, product_id, quantity, expires_at) VALUES (?, ?, ?, 0) '
+                'ON CONFLICT (cart, product_id) DO UPDATE SET quantity = excluded.quantity',
+                (key, product_id, quantity),
+            ))
+        else:
+            self._write(key, ('DELETE FROM guest_cart_line WHERE cart = ? AND product_id = ?', (key, product_id)))
+
+    def pop(self, key):
+        (rows,) = self._write(key, (
+            'DELETE FROM guest_cart_line WHERE cart = ? RETURNING product_id, quantity', (key,),
+        ))
+        return dict(rows)
+
+
+class RedisGuestCartStore(GuestCartStore):
+    """One Redis hash per cart (product_id -> quantity) at GUEST_CART_LOCATION, e.g. redis://localhost:6379/1"""
+    prefix = 'guest-cart:'
+
+    def __init__(self, location='', ttl=None):
+        super().__init__(location or 'redis://localhost:6379/0', ttl)
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured('RedisGuestCartStore requires the "redis" package.') from exc
+        self._redis = redis.Redis.from_url(self.location)
+
+    def get(self, key):
+        return {int(pk): int(quantity) for pk, quantity in self._redis.hgetall(self.prefix + key).items()}
+
+    def add(self, key, product_id, quantity):
+        pipe = self._redis.pipeline()
+        pipe.hincrby(self.prefix + key, product_id, quantity)
+        pipe.expire(self.prefix + key, self.ttl)
+        return pipe.execute()[0]
+
+    def set(self, key, product_id, quantity):
+        pipe = self._redis.pipeline()
+        if quantity:
+            pipe.hset(self.prefix + key, product_id, quantity)
+        else:
+            pipe.hdel(self.prefix + key, product_id)
+        pipe.expire(self.prefix + key, self.ttl)
+        pipe.execute()
+
+    def pop(self, key):
+        pipe = self._redis.pipeline()
+        pipe.hgetall(self.prefix + key)
+        pipe.delete(self.prefix + key)
+        lines = pipe.execute()[0]
+        return {int(pk): int(quantity) for pk, quantity in lines.items()}
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(settings.GUEST_CART_STORE)(settings.GUEST_CART_LOCATION)
+
+
+def merge_guest_cart(user, token, store=None):
+    """
+    Move a guest cart into the user's Cart (quantities are added to
+    existing lines) with one bulk upsert, then hold the merged lines'
+    stock. Lines that cannot be held stay in the cart and show as out of
+    stock in the cart summary. The guest cart is deleted only once the
+    merge has committed, so a failed merge leaves it in place.
+
+    Returns {'merged': number of merged lines, 'dropped': ids of products
+    that no longer exist, whose lines were dropped}.
+    """
+    result = {'merged': 0, 'dropped': []}
+    key = read_token(token)
+    if key is None:
+        return result
+    store = store or get_store()
+    lines = store.get(key)
+    if not lines:
+        return result
+    live = set(Product.objects.filter(pk__in=lines).values_list('pk', flat=True))
+    result['dropped'] = sorted(pk for pk in lines if pk not in live)
+    lines = {
+        pk: min(quantity, settings.GUEST_CART_MAX_QUANTITY)
+        for pk, quantity in lines.items() if pk in live and quantity > 0
+    }
+    with transaction.atomic():
+        quantities = Cart.objects.add_quantities(user, lines)
+        try:
+            with transaction.atomic():
+                hold_many(user, quantities)
+        except InsufficientStock:
+            # Hold what can be held; stock can still run out in between
+            short = set(unavailable(user, quantities))
+            try:
+                with transaction.atomic():
+                    hold_many(user, {pk: quantity for pk, quantity in quantities.items() if pk not in short})
+            except InsufficientStock:
+                pass
+    store.pop(key)
+    result['merged'] = len(lines)
+    return result
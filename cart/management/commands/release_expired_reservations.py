@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from cart.reservations import SWEEP_BATCH_SIZE, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Releases expired cart stock reservations back to available stock (run it every minute or so)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Released {result['released']} expired reservations in {result['batches']} batches"
+        ))
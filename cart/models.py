@@ -1,18 +1,105 @@
-from django.db import models
+from django.db import connections, models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from products.models import Product
 
 # Correct User model
 User = get_user_model()
 
+class CartManager(models.Manager):
+    def _upsert_sql(self, connection, rows, returning):
+        """INSERT ... ON CONFLICT DO UPDATE adding each row's quantity to the existing line"""
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        values = ', '.join(['(%s, %s, %s, %s)'] * rows)
+        return (
+            f'INSERT INTO {table} ("user_id", "product_id", "quantity", "added_at") '
+            f'VALUES {values} '
+            f'ON CONFLICT ("user_id", "product_id") '
+            f'DO UPDATE SET "quantity" = {table}."quantity" + excluded."quantity" '
+            f'RETURNING {returning}'
+        )
+
+    def add_quantity(self, user, product, quantity):
+        """
+        Add `quantity` units of `product` to the user's cart with a single
+        INSERT ... ON CONFLICT DO UPDATE statement, so concurrent adds to
+        the same line never lose an increment. Returns the line as stored
+        after the increment. (PostgreSQL, and SQLite >= 3.35.)
+        """
+        connection = connections[self.db]
+        added_at_field = self.model._meta.get_field('added_at')
+        sql = self._upsert_sql(connection, 1, '"id", "quantity", "added_at"')
+        params = [
+            user.pk, product.pk, quantity,
+            added_at_field.get_db_prep_value(timezone.now(), connection),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            pk, quantity, added_at = cursor.fetchone()
+
+        # Same conversion the ORM applies to a selected column (e.g. text -> datetime on SQLite)
+        column = added_at_field.get_col(self.model._meta.db_table)
+        for converter in connection.ops.get_db_converters(column) + added_at_field.get_db_converters(connection):
+            added_at = converter(added_at, column, connection)
+
+        line = self.model.from_db(
+            self.db, ['id', 'user_id', 'product_id', 'quantity', 'added_at'],
+            [pk, user.pk, product.pk, quantity, added_at],
+        )
+        line.user, line.product = user, product
+        return line
+
+    def add_quantities(self, user, quantities):
+        """
+        add_quantity() for many products at once: {product_id: quantity}
+        is upserted with one multi-row statement. Returns {product_id:
+        line quantity after the increment}.
+        """
+        if not quantities:
+            return {}
+        connection = connections[self.db]
+        added_at = self.model._meta.get_field('added_at').get_db_prep_value(timezone.now(), connection)
+        params = []
+        # Sorted, so concurrent merges lock lines in the same order
+        for product_id, quantity in sorted(quantities.items()):
+            params += [user.pk, product_id, quantity, added_at]
+        sql = self._upsert_sql(connection, len(quantities), '"product_id", "quantity"')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return dict(cursor.fetchall())
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="cart_items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartManager()
+
     class Meta:
         unique_together = ('user', 'product')
 
     def __str__(self):
         return f"{self.user.email} - {self.product.name}"
+
+
+class StockReservation(models.Model):
+    """
+    Units of a product held for one user's cart line until `expires_at`.
+    The total of all holds on a product is kept in Product.reserved_stock.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="stock_reservations")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            # The sweeper releases holds in expiry order
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.user_id} until {self.expires_at}"
@@ -0,0 +1,204 @@
+"""
+Time-limited stock holds for cart lines.
+
+Adding to the cart holds the line's quantity for CART_RESERVATION_TTL
+seconds, so two customers cannot both put the last unit in their carts.
+Every hold is also counted in Product.reserved_stock, so available stock
+(stock - reserved_stock) is read from the product row instead of summing
+reservations on every request. Each change to the counter is a guarded
+UPDATE (one statement for any number of products), so it never oversells
+and needs no lock on the product.
+
+Expired holds keep counting in reserved_stock until they are released.
+Paths that need the units (holding more, placing an order) first release
+the expired holds on the products they touch, so those never depend on
+the sweeper. Displayed availability (available_stock on the cart
+endpoints) still includes expired holds until the sweeper
+(`manage.py release_expired_reservations`)
+releases them in bulk.
+
+available_stock changes on every hold, so it is only served by the
+uncached cart endpoints (products.serializers.AvailableStockProductSerializer);
+the cached catalog responses and their validators leave it out.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from products.models import Product
+
+from .models import StockReservation
+
+SWEEP_BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids=()):
+        super().__init__(product_ids)
+        self.product_ids = list(product_ids)
+
+
+def hold(user, product_id, quantity):
+    """
+    Set the user's hold on a product to `quantity` units and restart its
+    TTL. Raises InsufficientStock if the extra units are not available.
+    """
+    hold_many(user, {product_id: quantity})
+
+
+def hold_many(user, quantities):
+    """
+    Set the user's holds to {product_id: quantity} (0 drops the hold) in a
+    fixed number of statements, whatever the number of products. Raises
+    InsufficientStock, before anything is committed, if any product lacks
+    the extra units.
+    """
+    with transaction.atomic():
+        # Expired holds on these products must not block the new ones
+        release_expired_on(list(quantities))
+        existing = {
+            r.product_id: r for r in StockReservation.objects.select_for_update()
+            .filter(user=user, product_id__in=quantities)
+        }
+        # Held units, expired or not, are still in reserved_stock until swept
+        deltas = {
+            pk: quantity - (existing[pk].quantity if pk in existing else 0)
+            for pk, quantity in quantities.items()
+        }
+        grow = {pk: delta for pk, delta in deltas.items() if delta > 0}
+        shrink = {pk: delta for pk, delta in deltas.items() if delta < 0}
+
+        if grow:
+            delta = Case(*[When(pk=pk, then=Value(d)) for pk, d in grow.items()])
+            held = Product.objects.filter(
+                pk__in=grow, stock__gte=F('reserved_stock') + delta
+            ).update(reserved_stock=F('reserved_stock') + delta)
+            if held != len(grow):
+                raise InsufficientStock(list(grow))
+        if shrink:
+            Product.all_objects.filter(pk__in=shrink).update(reserved_stock=Case(
+                *[When(pk=pk, then=F('reserved_stock') + d) for pk, d in shrink.items()]
+            ))
+
+        expires_at = timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TTL)
+        dropped = [r.pk for pk, r in existing.items() if not quantities[pk]]
+        if dropped:
+            StockReservation.objects.filter(pk__in=dropped).delete()
+        changed = []
+        for pk, r in existing.items():
+            if quantities[pk]:
+                r.quantity, r.expires_at = quantities[pk], expires_at
+                changed.append(r)
+        StockReservation.objects.bulk_update(changed, ['quantity', 'expires_at'])
+        StockReservation.objects.bulk_create([
+            StockReservation(user=user, product_id=pk, quantity=quantity, expires_at=expires_at)
+            for pk, quantity in quantities.items() if quantity and pk not in existing
+        ])
+
+
+def unavailable(user, quantities):
+    """Product ids in {product_id: quantity} this user cannot hold that many units of"""
+    held = dict(
+        StockReservation.objects.filter(user=user, product_id__in=quantities)
+        .values_list('product_id', 'quantity')
+    )
+    rows = Product.objects.filter(pk__in=quantities).values_list('pk', 'stock', 'reserved_stock')
+    available = {pk: stock - reserved + held.get(pk, 0) for pk, stock, reserved in rows}
+    return sorted(pk for pk, quantity in quantities.items() if quantity > available.get(pk, 0))
+
+
+def release(user, product_id):
+    """Drop the user's hold on a product, returning its units to available stock"""
+    with transaction.atomic():
+        quantity = consume(user, product_id)
+        if quantity:
+            Product.all_objects.filter(pk=product_id).update(reserved_stock=F('reserved_stock') - quantity)
+    return quantity
+
+
+def consume(user, product_id):
+    """
+    Delete the user's hold and return how many units it held, without
+    touching Product.reserved_stock: the caller must subtract them in the
+    same transaction (e.g. together with the stock decrement of an order).
+    """
+    reservation = (
+        StockReservation.objects.select_for_update()
+        .filter(user=user, product_id=product_id)
+        .first()
+    )
+    if reservation is None:
+        return 0
+    reservation.delete()
+    return reservation.quantity
+
+
+def consume_many(user, product_ids):
+    """
+    consume() for many products with one SELECT and one DELETE. Returns
+    {product_id: held units} for the products the user had a hold on.
+    """
+    reservations = list(
+        StockReservation.objects.select_for_update()
+        .filter(user=user, product_id__in=product_ids)
+        .values_list('id', 'product_id', 'quantity')
+    )
+    if reservations:
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in reservations]).delete()
+    return {product_id: quantity for _, product_id, quantity in reservations}
+
+
+def release_expired_on(product_ids, now=None):
+    """
+    Release the expired holds on some products in the caller's transaction,
+    so they do not block new holds or sales while waiting for the sweeper.
+    One SELECT when there are none.
+    """
+    rows = list(
+        StockReservation.objects.select_for_update(skip_locked=True)
+        .filter(product_id__in=product_ids, expires_at__lte=now or timezone.now())
+        .values_list('id', 'product_id', 'quantity')
+    )
+    if rows:
+        _release_rows(rows)
+    return len(rows)
+
+
+def _release_rows(rows):
+    """Delete (id, product_id, quantity) holds and subtract their units with one UPDATE"""
+    totals = {}
+    for _, product_id, quantity in rows:
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    Product.all_objects.filter(pk__in=totals).update(reserved_stock=Case(
+        *[When(pk=pk, then=F('reserved_stock') - total) for pk, total in totals.items()]
+    ))
+
+
+def release_expired(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """
+    Release every expired hold, one short transaction per batch: delete
+    the batch with one DELETE and subtract its units from all affected
+    products with one UPDATE.
+    """
+    now = now or timezone.now()
+    released = batches = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', 'product_id', 'quantity')[:batch_size]
+            )
+            if not rows:
+                break
+            _release_rows(rows)
+        released += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return {'released': released, 'batches': batches}
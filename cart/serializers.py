@@ -1,10 +1,51 @@
 from rest_framework import serializers
 from .models import Cart
-from products.serializers import ProductSerializer
+from products.serializers import AvailableStockProductSerializer
+from products.sparse import SparseFieldsMixin, parse_fields
 
-class CartSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+class CartSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product = AvailableStockProductSerializer(read_only=True)
 
     class Meta:
         model = Cart
         fields = ['id', 'product', 'quantity', 'added_at']
+
+
+CART_PRODUCT_FIELDS = parse_fields('id,name,price,image_variants,available_stock')
+
+
+class CartSummaryItemSerializer(serializers.ModelSerializer):
+    """A cart line with just what the cart badge/checkout page shows; see cart.views.summary_lines"""
+    product = AvailableStockProductSerializer(read_only=True, fields=CART_PRODUCT_FIELDS)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    out_of_stock = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Cart
+        fields = ['id', 'product', 'quantity', 'line_total', 'out_of_stock']
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """One step of a batch cart update; see cart.batch.apply_operations"""
+    op = serializers.ChoiceField(choices=['set', 'increment', 'remove'])
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'remove':
+            attrs.pop('quantity', None)
+        elif 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': 'This field is required.'})
+        elif attrs['op'] == 'set' and attrs['quantity'] < 0:
+            raise serializers.ValidationError({'quantity': 'Ensure this value is greater than or equal to 0.'})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class GuestCartItemSerializer(serializers.Serializer):
+    """A line of a guest cart (see cart.guest): {'product': Product, 'quantity': int}"""
+    product = AvailableStockProductSerializer(read_only=True, fields=CART_PRODUCT_FIELDS)
+    quantity = serializers.IntegerField(read_only=True)
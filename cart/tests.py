@@ -1,3 +1,400 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.models import Product
+from . import guest, reservations
+from .models import Cart, StockReservation
+
+User = get_user_model()
+
+
+class AddToCartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=50)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, quantity):
+        return self.client.post('/api/cart/add/', {'product': self.product.id, 'quantity': quantity})
+
+    def test_creates_line_with_requested_quantity(self):
+        response = self.add(3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['quantity'], 3)
+        self.assertEqual(Cart.objects.get().quantity, 3)
+
+    def test_increments_existing_line(self):
+        self.add(2)
+        response = self.add(5)
+        self.assertEqual(response.data['quantity'], 7)
+        self.assertEqual(response.data['product']['id'], self.product.id)
+        self.assertIsNotNone(response.data['added_at'])
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_rejects_invalid_quantity(self):
+        self.assertEqual(self.add(0).status_code, 400)
+        self.assertEqual(self.add('many').status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_not_enough_stock_leaves_cart_unchanged(self):
+        self.add(50)
+        self.assertEqual(self.add(1).status_code, 400)
+        self.assertEqual(Cart.objects.get().quantity, 50)
+
+    def test_expired_holds_do_not_block(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw')
+        StockReservation.objects.create(
+            user=other, product=self.product, quantity=45, expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        Product.objects.filter(pk=self.product.pk).update(reserved_stock=45)
+        response = self.add(10)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['product']['available_stock'], 40)
+        self.assertFalse(StockReservation.objects.filter(user=other).exists())
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='pw') for i in range(3)
+        ]
+        self.wheel = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.horn = Product.objects.create(name='Horn', price='5.00', stock=5)
+
+    def reserved(self):
+        return dict(Product.objects.values_list('name', 'reserved_stock'))
+
+    def test_hold_grow_shrink_and_release(self):
+        reservations.hold_many(self.users[0], {self.wheel.id: 3, self.horn.id: 1})
+        reservations.hold(self.users[0], self.wheel.id, 1)
+        self.assertEqual(self.reserved(), {'Wheel': 1, 'Horn': 1})
+        with self.assertRaises(reservations.InsufficientStock) as raised:
+            reservations.hold(self.users[1], self.wheel.id, 5)
+        self.assertEqual(raised.exception.product_ids, [self.wheel.id])
+        self.assertEqual(reservations.release(self.users[0], self.horn.id), 1)
+        self.assertEqual(self.reserved(), {'Wheel': 1, 'Horn': 0})
+
+    def test_sweeper_releases_expired_holds_in_batches(self):
+        for user in self.users:
+            reservations.hold_many(user, {self.wheel.id: 1, self.horn.id: 1})
+        StockReservation.objects.exclude(user=self.users[2]).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reservations.release_expired(batch_size=3), {'released': 4, 'batches': 2})
+        self.assertEqual(self.reserved(), {'Wheel': 1, 'Horn': 1})
+        self.assertEqual(set(StockReservation.objects.values_list('user_id', flat=True)), {self.users[2].id})
+
+class ConcurrentAddToCartTests(TransactionTestCase):
+    THREADS = 8
+    ADDS_PER_THREAD = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=1000)
+
+    @skipUnlessDBFeature('supports_update_conflicts_with_target')
+    def test_concurrent_adds_to_one_line_are_not_lost(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Shared-cache in-memory SQLite fails lock waits instead of retrying them
+            self.skipTest('needs a database server or an SQLite file')
+
+        errors = []
+        start = threading.Barrier(self.THREADS)
+
+        def hammer():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                start.wait()
+                for _ in range(self.ADDS_PER_THREAD):
+                    response = client.post('/api/cart/add/', {'product': self.product.id, 'quantity': 1})
+                    if response.status_code != 201:
+                        errors.append(response.status_code)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=hammer) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        line = Cart.objects.get(user=self.user, product=self.product)
+        self.assertEqual(line.quantity, self.THREADS * self.ADDS_PER_THREAD)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved_stock, line.quantity)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.wheel = Product.objects.create(name='Wheel', price='99.00', stock=10)
+        self.horn = Product.objects.create(name='Horn', price='5.00', stock=10)
+        self.mirror = Product.objects.create(name='Mirror', price='20.00', stock=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, *operations):
+        return self.client.post('/api/cart/batch/', {'operations': list(operations)}, format='json')
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def reserved(self):
+        return dict(Product.objects.values_list('id', 'reserved_stock'))
+
+    def test_applies_operations_in_order(self):
+        self.client.post('/api/cart/add/', {'product': self.wheel.id, 'quantity': 2})
+        self.client.post('/api/cart/add/', {'product': self.horn.id, 'quantity': 1})
+        response = self.batch(
+            {'op': 'increment', 'product': self.wheel.id, 'quantity': 3},
+            {'op': 'remove', 'product': self.horn.id},
+            {'op': 'set', 'product': self.mirror.id, 'quantity': 1},
+            {'op': 'increment', 'product': self.mirror.id, 'quantity': 1},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({line['product']['id']: line['quantity'] for line in response.data},
+                         {self.wheel.id: 5, self.mirror.id: 2})
+        self.assertEqual(self.quantities(), {self.wheel.id: 5, self.mirror.id: 2})
+        self.assertEqual(self.reserved(), {self.wheel.id: 5, self.horn.id: 0, self.mirror.id: 2})
+
+    def test_runs_a_fixed_number_of_statements(self):
+        self.batch(*[{'op': 'set', 'product': p.id, 'quantity': 1} for p in (self.wheel, self.horn)])
+        operations = [
+            {'op': 'set', 'product': self.wheel.id, 'quantity': 3},
+            {'op': 'remove', 'product': self.horn.id},
+            {'op': 'set', 'product': self.mirror.id, 'quantity': 2},
+        ]
+        # Lines: lock, product lookup, DELETE, UPDATE, INSERT. Holds: expired-hold sweep, lock,
+        # grow, shrink, DELETE, UPDATE, INSERT. Then the cart read, plus two savepoint pairs
+        with self.assertNumQueries(17):
+            self.batch(*operations)
+
+    def test_not_enough_stock_changes_nothing(self):
+        self.batch({'op': 'set', 'product': self.wheel.id, 'quantity': 1})
+        response = self.batch(
+            {'op': 'set', 'product': self.wheel.id, 'quantity': 4},
+            {'op': 'set', 'product': self.mirror.id, 'quantity': 3},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['products'], [self.mirror.id])
+        self.assertEqual(self.quantities(), {self.wheel.id: 1})
+        self.assertEqual(self.reserved()[self.wheel.id], 1)
+
+    def test_rejects_unknown_products_and_bad_operations(self):
+        response = self.batch({'op': 'increment', 'product': 999999, 'quantity': 1})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['products'], [999999])
+        self.assertEqual(self.batch({'op': 'set', 'product': self.wheel.id}).status_code, 400)
+        self.assertEqual(self.batch({'op': 'empty', 'product': self.wheel.id}).status_code, 400)
+        self.assertEqual(self.client.post('/api/cart/batch/', {'operations': []}, format='json').status_code, 400)
+        self.assertFalse(Cart.objects.exists())
+
+
+class GuestCartStoreTests(TestCase):
+    def check_store(self, store):
+        self.assertEqual(store.get('a'), {})
+        self.assertEqual(store.add('a', 1, 2), 2)
+        self.assertEqual(store.add('a', 1, 3), 5)
+        store.set('a', 2, 4)
+        store.add('b', 1, 1)
+        self.assertEqual(store.get('a'), {1: 5, 2: 4})
+        store.set('a', 2, 0)
+        self.assertEqual(store.pop('a'), {1: 5})
+        self.assertEqual(store.get('a'), {})
+        self.assertEqual(store.get('b'), {1: 1})
+
+        expired = type(store)(store.location, ttl=-1)
+        expired.add('c', 1, 1)
+        self.assertEqual(expired.get('c'), {})
+
+    def test_in_memory_store(self):
+        self.check_store(guest.InMemoryGuestCartStore())
+
+    def test_sqlite_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.check_store(guest.SQLiteGuestCartStore(os.path.join(directory, 'carts.sqlite3')))
+
+    def test_tokens_are_signed(self):
+        token = guest.new_token()
+        self.assertIsNotNone(guest.read_token(token))
+        self.assertIsNone(guest.read_token(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+        self.assertIsNone(guest.read_token('not-a-token'))
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        self.wheel = Product.objects.create(name='Wheel', price='99.00', stock=10)
+        self.horn = Product.objects.create(name='Horn', price='5.00', stock=1)
+        self.client = APIClient()
+
+    def add(self, product, quantity, token=None):
+        headers = {'HTTP_X_CART_TOKEN': token} if token else {}
+        return self.client.post('/api/cart/guest/add/', {'product': product.id, 'quantity': quantity}, **headers)
+
+    def test_add_starts_a_cart_and_reuses_its_token(self):
+        response = self.add(self.wheel, 2)
+        self.assertEqual(response.status_code, 201)
+        token = response.data['token']
+        self.assertEqual(response[guest.TOKEN_HEADER], token)
+        self.add(self.wheel, 1, token)
+        self.add(self.horn, 1, token)
+
+        response = self.client.get('/api/cart/guest/', HTTP_X_CART_TOKEN=token)
+        self.assertEqual({item['product']['id']: item['quantity'] for item in response.data['items']},
+                         {self.wheel.id: 3, self.horn.id: 1})
+        self.assertFalse(Cart.objects.exists())
+
+        self.client.delete(f'/api/cart/guest/remove/{self.horn.id}/', HTTP_X_CART_TOKEN=token)
+        response = self.client.get('/api/cart/guest/', HTTP_X_CART_TOKEN=token)
+        self.assertEqual([item['product']['id'] for item in response.data['items']], [self.wheel.id])
+
+    def test_forged_token_gets_a_new_cart(self):
+        response = self.add(self.wheel, 1, 'forged:token')
+        self.assertNotEqual(response.data['token'], 'forged:token')
+        self.assertEqual(self.client.get('/api/cart/guest/', HTTP_X_CART_TOKEN='forged:token').data['items'], [])
+
+    def test_login_merges_guest_cart(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        Cart.objects.create(user=user, product=self.wheel, quantity=1)
+        token = self.add(self.wheel, 2).data['token']
+        self.add(self.horn, 3, token)
+
+        response = self.client.post(
+            '/api/accounts/login/', {'email': 'buyer@example.com', 'password': 'pw'}, HTTP_X_CART_TOKEN=token,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['merged_cart_items'], 2)
+        lines = dict(Cart.objects.filter(user=user).values_list('product_id', 'quantity'))
+        self.assertEqual(lines, {self.wheel.id: 3, self.horn.id: 3})
+        # The wheel line is held; 3 horns are more than there is stock for
+        self.assertEqual(dict(Product.objects.values_list('id', 'reserved_stock')),
+                         {self.wheel.id: 3, self.horn.id: 0})
+        self.assertEqual(self.client.get('/api/cart/guest/', HTTP_X_CART_TOKEN=token).data['items'], [])
+
+
+    @override_settings(GUEST_CART_MAX_QUANTITY=10)
+    def test_add_validates_and_caps_quantity(self):
+        for quantity in [0, -1, 'many', 11]:
+            self.assertEqual(self.add(self.wheel, quantity).status_code, 400, quantity)
+        token = self.add(self.wheel, 8).data['token']
+        response = self.add(self.wheel, 8, token)
+        self.assertEqual(response.data['items'][0]['quantity'], 10)
+
+    def login(self, token):
+        return self.client.post(
+            '/api/accounts/login/', {'email': 'buyer@example.com', 'password': 'pw'}, HTTP_X_CART_TOKEN=token,
+        )
+
+    def test_login_reports_dropped_products(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        token = self.add(self.wheel, 1).data['token']
+        self.add(self.horn, 1, token)
+        self.horn.soft_delete()
+        response = self.login(token)
+        self.assertEqual((response.data['merged_cart_items'], response.data['dropped_cart_products']),
+                         (1, [self.horn.id]))
+        self.assertEqual(list(Cart.objects.filter(user=user).values_list('product_id', flat=True)), [self.wheel.id])
+
+    def test_failed_merge_keeps_guest_cart_and_logs_in(self):
+        User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        token = self.add(self.wheel, 2).data['token']
+        with mock.patch.object(Cart.objects, 'add_quantities', side_effect=DatabaseError):
+            response = self.login(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['cart_merge_failed'])
+        self.assertFalse(Cart.objects.exists())
+        items = self.client.get('/api/cart/guest/', HTTP_X_CART_TOKEN=token).data['items']
+        self.assertEqual([(item['product']['id'], item['quantity']) for item in items], [(self.wheel.id, 2)])
+
+    def test_stock_running_out_during_merge_keeps_lines_unheld(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        token = self.add(self.horn, 2).data['token']
+        # As if the stock was checked before another buyer took it
+        with mock.patch.object(guest, 'unavailable', return_value=[]):
+            response = self.login(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['merged_cart_items'], 1)
+        self.assertEqual(Cart.objects.get(user=user).quantity, 2)
+        self.assertFalse(StockReservation.objects.exists())
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def line(self, user, product, quantity, held=0):
+        Cart.objects.create(user=user, product=product, quantity=quantity)
+        if held:
+            StockReservation.objects.create(
+                user=user, product=product, quantity=held, expires_at=timezone.now() + timedelta(minutes=10)
+            )
+            Product.all_objects.filter(pk=product.pk).update(reserved_stock=F('reserved_stock') + held)
+
+    def test_totals_and_out_of_stock_lines(self):
+        wheel = Product.objects.create(name='Wheel', price='99.50', stock=5)
+        horn = Product.objects.create(name='Horn', price='5.00', stock=3)
+        old = Product.objects.create(name='Old', price='1.00', stock=9)
+        self.line(self.user, wheel, 2, held=2)
+        # Two of the three horns are held by someone else
+        self.line(self.other, horn, 2, held=2)
+        self.line(self.user, horn, 2)
+        self.line(self.user, old, 1)
+        old.soft_delete()
+
+        # The lines, then the totals
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/summary/')
+        data = response.data
+        self.assertEqual(
+            (data['line_count'], data['item_count'], data['subtotal'], data['out_of_stock_count']),
+            (3, 5, '210.00', 2),
+        )
+        self.assertTrue(data['has_out_of_stock'])
+        self.assertEqual(
+            {item['product']['name']: item['out_of_stock'] for item in data['items']},
+            {'Wheel': False, 'Horn': True, 'Old': True},
+        )
+
+    def test_empty_cart(self):
+        data = self.client.get('/api/cart/summary/').data
+        self.assertEqual((data['items'], data['item_count'], data['subtotal']), ([], 0, '0.00'))
+
+class CartSparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.line = Cart.objects.create(user=self.user, product=self.product, quantity=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_fields_without_product(self):
+        response = self.client.get('/api/cart/', {'fields': 'id,quantity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'id': self.line.id, 'quantity': 2}])
+
+    def test_list_nested_product_fields(self):
+        response = self.client.get('/api/cart/', {'fields': 'quantity,product.name'})
+        self.assertEqual(response.data, [{'quantity': 2, 'product': {'name': 'Wheel'}}])
+
+    def test_batch_fields_without_product(self):
+        response = self.client.post(
+            '/api/cart/batch/?fields=id,quantity',
+            {'operations': [{'op': 'increment', 'product': self.product.id, 'quantity': 1}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'id': self.line.id, 'quantity': 3}])
@@ -3,6 +3,11 @@ from . import views
 
 urlpatterns = [
     path('', views.CartListCreateView.as_view(), name='cart'),
+    path('summary/', views.CartSummaryView.as_view(), name='cart_summary'),
+    path('batch/', views.CartBatchView.as_view(), name='cart_batch'),
     path('add/', views.AddToCartView.as_view(), name='add_to_cart'),
+    path('guest/', views.GuestCartView.as_view(), name='guest_cart'),
+    path('guest/add/', views.GuestAddToCartView.as_view(), name='guest_add_to_cart'),
+    path('guest/remove/<int:product_id>/', views.GuestRemoveFromCartView.as_view(), name='guest_remove_from_cart'),
     path('remove/<int:pk>/', views.RemoveFromCartView.as_view(), name='remove_from_cart'),
 ]
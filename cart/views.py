@@ -1,8 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from .models import Cart
-from .serializers import CartSerializer
+from rest_framework.views import APIView
+from . import guest
+from .batch import UnknownProducts, apply_operations
+from .models import Cart, StockReservation
+from .reservations import InsufficientStock, hold, release
+from .serializers import (
+    CART_PRODUCT_FIELDS, CartBatchSerializer, CartSerializer, CartSummaryItemSerializer,
+    GuestCartItemSerializer,
+)
 from products.models import Product
+from products.serializers import AvailableStockProductSerializer
+from products.sparse import fields_from_request, only_fields, sparse_queryset
 
 class CartListCreateView(generics.ListCreateAPIView):
     serializer_class = CartSerializer
@@ -12,8 +27,10 @@ class CartListCreateView(generics.ListCreateAPIView):
         return Cart.objects.filter(user=self.request.user)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        fields = fields_from_request(request)
+        queryset = self.get_queryset().select_related('product')
+        queryset = sparse_queryset(queryset, CartSerializer, fields)
+        serializer = self.get_serializer(queryset, many=True, fields=fields)
         return Response(serializer.data)
 
 class AddToCartView(generics.CreateAPIView):
@@ -22,20 +39,29 @@ class AddToCartView(generics.CreateAPIView):
 
     def create(self, request, *args, **kwargs):
         product_id = request.data.get("product")
-        quantity = request.data.get("quantity", 1)
+        try:
+            quantity = int(request.data.get("quantity", 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            return Response({"detail": "Quantity must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+        except (Product.DoesNotExist, ValueError):
             return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user, product=product
-        )
-        if not created:
-            cart_item.quantity += int(quantity)
-        cart_item.save()
+        try:
+            with transaction.atomic():
+                # One upsert: creates the line or adds to it atomically
+                cart_item = Cart.objects.add_quantity(request.user, product, quantity)
+                # Hold the whole line for CART_RESERVATION_TTL
+                hold(request.user, product.id, cart_item.quantity)
+        except InsufficientStock:
+            return Response({"detail": "Not enough stock."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # available_stock must reflect the hold just taken
+        cart_item.product.refresh_from_db(fields=['stock', 'reserved_stock'])
         serializer = CartSerializer(cart_item)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -47,5 +73,160 @@ class RemoveFromCartView(generics.DestroyAPIView):
         cart_item = self.get_object()
         if cart_item.user != request.user:
             return Response({"detail": "Not allowed."}, status=status.HTTP_403_FORBIDDEN)
-        cart_item.delete()
+        with transaction.atomic():
+            cart_item.delete()
+            release(request.user, cart_item.product_id)
+        return Response({"detail": "Item removed from cart."}, status=status.HTTP_204_NO_CONTENT)
+
+class CartBatchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        """Apply set/increment/remove operations in one transaction and return the resulting cart"""
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            apply_operations(request.user, serializer.validated_data['operations'])
+        except UnknownProducts as exc:
+            return Response(
+                {"detail": "Product not found.", "products": exc.product_ids},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except InsufficientStock as exc:
+            return Response(
+                {"detail": "Not enough stock.", "products": exc.product_ids},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fields = fields_from_request(request)
+        queryset = Cart.objects.filter(user=request.user).select_related('product')
+        queryset = sparse_queryset(queryset, CartSerializer, fields)
+        return Response(CartSerializer(queryset, many=True, fields=fields).data)
+
+
+def summary_lines(user):
+    """
+    The user's cart lines with their product, line total and an
+    out-of-stock flag. A line is out of stock when the product was
+    trashed or fewer units are available to this user (stock minus
+    everyone else's holds) than the line's quantity.
+    """
+    own_hold = StockReservation.objects.filter(
+        user=user, product=OuterRef('product')
+    ).values('quantity')
+    available = F('product__stock') - F('product__reserved_stock') + Coalesce(Subquery(own_hold), Value(0))
+    return (
+        Cart.objects.filter(user=user)
+        .select_related('product')
+        .only(*only_fields(CartSummaryItemSerializer()))
+        .annotate(
+            line_total=ExpressionWrapper(
+                F('quantity') * F('product__price'),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            out_of_stock=ExpressionWrapper(
+                Q(product__is_deleted=True) | Q(quantity__gt=available),
+                output_field=BooleanField(),
+            ),
+        )
+        .order_by('-added_at', '-id')
+    )
+
+
+class CartSummaryView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """Cart lines plus subtotal, item count and stock flags, in two queries"""
+        lines = summary_lines(request.user)
+        totals = lines.aggregate(
+            line_count=Count('id'),
+            item_count=Coalesce(Sum('quantity'), 0),
+            subtotal=Coalesce(
+                Sum('line_total'), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            out_of_stock_count=Count('id', filter=Q(out_of_stock=True)),
+        )
+        return Response({
+            "items": CartSummaryItemSerializer(lines, many=True).data,
+            "line_count": totals['line_count'],
+            "item_count": totals['item_count'],
+            "subtotal": f"{totals['subtotal']:.2f}",
+            "out_of_stock_count": totals['out_of_stock_count'],
+            "has_out_of_stock": totals['out_of_stock_count'] > 0,
+        })
+
+
+class GuestCartMixin:
+    """
+    Cart of an anonymous visitor, kept in the guest cart store and
+    identified by the signed token in the X-Cart-Token header. It is
+    merged into the user's cart on login.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def guest_key(self, request):
+        return guest.read_token(request.headers.get(guest.TOKEN_HEADER))
+
+    def cart_response(self, token, lines, status_code=status.HTTP_200_OK):
+        product_fields = only_fields(AvailableStockProductSerializer(fields=CART_PRODUCT_FIELDS))
+        products = Product.objects.only(*product_fields).in_bulk(list(lines))
+        items = [
+            {"product": products[pk], "quantity": quantity}
+            for pk, quantity in lines.items() if pk in products
+        ]
+        response = Response({
+            "token": token,
+            "items": GuestCartItemSerializer(items, many=True).data,
+        }, status=status_code)
+        if token:
+            response[guest.TOKEN_HEADER] = token
+        return response
+
+
+class GuestCartView(GuestCartMixin, APIView):
+    def get(self, request):
+        key = self.guest_key(request)
+        if key is None:
+            return self.cart_response(None, {})
+        return self.cart_response(request.headers[guest.TOKEN_HEADER], guest.get_store().get(key))
+
+
+class GuestAddToCartView(GuestCartMixin, APIView):
+    def post(self, request):
+        """Add to a guest cart, starting a new one (and token) if the request has none"""
+        product_id = request.data.get("product")
+        try:
+            quantity = int(request.data.get("quantity", 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if not 1 <= quantity <= settings.GUEST_CART_MAX_QUANTITY:
+            return Response(
+                {"detail": f"Quantity must be between 1 and {settings.GUEST_CART_MAX_QUANTITY}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            product_id = None
+        if product_id is None or not Product.objects.filter(pk=product_id).exists():
+            return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        key = self.guest_key(request)
+        token = request.headers.get(guest.TOKEN_HEADER)
+        if key is None:
+            token = guest.new_token()
+            key = guest.read_token(token)
+        store = guest.get_store()
+        if store.add(key, product_id, quantity) > settings.GUEST_CART_MAX_QUANTITY:
+            store.set(key, product_id, settings.GUEST_CART_MAX_QUANTITY)
+        return self.cart_response(token, store.get(key), status.HTTP_201_CREATED)
+
+
+class GuestRemoveFromCartView(GuestCartMixin, APIView):
+    def delete(self, request, product_id):
+        key = self.guest_key(request)
+        if key is None:
+            return Response({"detail": "Cart not found."}, status=status.HTTP_404_NOT_FOUND)
+        guest.get_store().set(key, product_id, 0)
         return Response({"detail": "Item removed from cart."}, status=status.HTTP_204_NO_CONTENT)
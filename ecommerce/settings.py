@@ -2,6 +2,7 @@ from pathlib import Path
 from datetime import timedelta
 import os
 from decouple import config
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -109,6 +110,21 @@ DATABASES = {
     }
 }
 
+# ----------------------------
+# CACHE
+# ----------------------------
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) in production
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ecommerce-default'),
+    }
+}
+
+# Seconds a cached catalog response lives (it is also invalidated on every product change)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
 # ----------------------------
 # PASSWORD VALIDATION
 # ----------------------------
@@ -135,6 +151,31 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Product image thumbnails/medium variants are rendered in a background thread pool
+PRODUCT_IMAGE_ASYNC = config('PRODUCT_IMAGE_ASYNC', default=True, cast=bool)
+PRODUCT_IMAGE_WORKERS = config('PRODUCT_IMAGE_WORKERS', default=2, cast=int)
+
+# Trashed products older than this are removed by `manage.py purge_product_trash`
+PRODUCT_TRASH_RETENTION_DAYS = config('PRODUCT_TRASH_RETENTION_DAYS', default=30, cast=int)
+
+# Seconds a cart line holds its units (released by `manage.py release_expired_reservations`)
+CART_RESERVATION_TTL = config('CART_RESERVATION_TTL', default=900, cast=int)
+
+# Anonymous carts live in a key-value store (see cart.guest): InMemoryGuestCartStore,
+# SQLiteGuestCartStore (LOCATION = file path) or RedisGuestCartStore (LOCATION = redis:// URL)
+GUEST_CART_STORE = config('GUEST_CART_STORE', default='cart.guest.InMemoryGuestCartStore')
+GUEST_CART_LOCATION = config('GUEST_CART_LOCATION', default='')
+GUEST_CART_TTL = config('GUEST_CART_TTL', default=60 * 60 * 24 * 30, cast=int)
+# Largest quantity a guest cart line may hold
+GUEST_CART_MAX_QUANTITY = config('GUEST_CART_MAX_QUANTITY', default=99, cast=int)
+
+# `manage.py generate_low_stock_alerts` notifies admins at or below these stock levels
+LOW_STOCK_THRESHOLD = config('LOW_STOCK_THRESHOLD', default=5, cast=int)
+CRITICAL_STOCK_THRESHOLD = config('CRITICAL_STOCK_THRESHOLD', default=0, cast=int)
+
+# JSON product list pages skip ProductSerializer (see products.fastpath)
+PRODUCT_LIST_FAST_PATH = config('PRODUCT_LIST_FAST_PATH', default=True, cast=bool)
+
 # ----------------------------
 # REST FRAMEWORK
 # ----------------------------
@@ -169,6 +210,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:5173",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Guest carts are identified by this header (see cart.guest)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-cart-token')
+CORS_EXPOSE_HEADERS = ['X-Cart-Token']
 
 # ----------------------------
 # CSRF TRUSTED ORIGINS
@@ -0,0 +1,138 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection, transaction
+
+from orders.models import Order, OrderItem
+from orders.views import take_stock
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs N concurrent buyers of one product through the old checkout (select_for_update, '
+        'payment call inside the transaction) and the guarded-UPDATE checkout (payment call after '
+        'commit) and compares throughput. Creates its own users and product and deletes them afterwards. '
+        'Run it against PostgreSQL/MySQL: SQLite has no row locks and serializes all writers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=50, help='Concurrent buyers (one thread each)')
+        parser.add_argument('--stock', type=int, help='Units on sale (default: one per buyer)')
+        parser.add_argument('--quantity', type=int, default=1, help='Units each buyer orders')
+        parser.add_argument('--gateway-ms', type=float, default=50,
+                            help='Simulated payment gateway latency per order, in milliseconds')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite ignores select_for_update and allows one writer at a time; '
+                'numbers are not representative of a database server'
+            ))
+        self.quantity = options['quantity']
+        self.gateway_delay = options['gateway_ms'] / 1000
+        stock = options['stock'] if options['stock'] is not None else options['buyers'] * self.quantity
+
+        tag = uuid.uuid4().hex[:8]
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f'bench-{tag}-{i}', email=f'bench-{tag}-{i}@example.com')
+            for i in range(options['buyers'])
+        ])
+        users = list(User.objects.filter(username__startswith=f'bench-{tag}-'))
+        self.product = Product.objects.create(name=f'Benchmark {tag}', price='100.00', stock=stock)
+        try:
+            results = {}
+            for name, checkout in [('select_for_update', self.locking_checkout),
+                                   ('guarded UPDATE', self.guarded_checkout)]:
+                Order.objects.filter(user__in=users).delete()
+                Product.all_objects.filter(pk=self.product.pk).update(stock=stock, reserved_stock=0)
+                results[name] = self.run(checkout, users, stock)
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            Product.all_objects.filter(pk=self.product.pk).delete()
+            try:
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            except DatabaseError as e:
+                self.stdout.write(self.style.WARNING(f'Could not delete the bench-{tag}-* users: {e}'))
+
+        before, after = results['select_for_update'], results['guarded UPDATE']
+        self.stdout.write(self.style.SUCCESS(
+            f"Throughput: {after['rate'] / before['rate']:.1f}x "
+            f"({before['rate']:.1f} -> {after['rate']:.1f} orders/s)"
+        ))
+
+    def run(self, checkout, users, stock):
+        latencies, outcomes = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(len(users))
+
+        def buyer(user):
+            try:
+                start.wait()
+                began = time.perf_counter()
+                try:
+                    outcome = 'sold' if checkout(user) else 'sold out'
+                except Exception as e:
+                    outcome = f'error: {type(e).__name__}'
+                with lock:
+                    latencies.append(time.perf_counter() - began)
+                    outcomes.append(outcome)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(user,)) for user in users]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        sold = outcomes.count('sold')
+        errors = len(outcomes) - sold - outcomes.count('sold out')
+        left = Product.all_objects.values_list('stock', flat=True).get(pk=self.product.pk)
+        rate = sold / elapsed if elapsed else 0
+        name = checkout.__doc__.strip()
+        self.stdout.write(
+            f'{name}\n'
+            f'  {len(users)} buyers, {sold} sold, {outcomes.count("sold out")} sold out, {errors} errors '
+            f'in {elapsed * 1000:.0f} ms ({rate:.1f} orders/s)\n'
+            f'  latency p50 {statistics.median(latencies) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms'
+        )
+        if left != stock - sold * self.quantity:
+            self.stdout.write(self.style.ERROR(f'  stock left is {left}, expected {stock - sold * self.quantity}'))
+        return {'rate': rate, 'sold': sold, 'errors': errors}
+
+    def payment_gateway(self):
+        time.sleep(self.gateway_delay)
+
+    def create_order(self, user):
+        order = Order.objects.create(user=user, total=self.product.price * self.quantity, address='Benchmark')
+        OrderItem.objects.create(order=order, product=self.product, quantity=self.quantity, price=self.product.price)
+
+    def locking_checkout(self, user):
+        """Before: row lock on the product for the whole request, gateway call included"""
+        with transaction.atomic():
+            product = Product.objects.select_for_update().get(pk=self.product.pk)
+            if product.stock - product.reserved_stock < self.quantity:
+                return False
+            product.stock -= self.quantity
+            product.save(update_fields=['stock'])
+            self.create_order(user)
+            self.payment_gateway()
+        return True
+
+    def guarded_checkout(self, user):
+        """After: one guarded UPDATE decides the sale, gateway call after commit"""
+        with transaction.atomic():
+            if not take_stock(self.product.pk, self.quantity):
+                return False
+            self.create_order(user)
+        self.payment_gateway()
+        return True
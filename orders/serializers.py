@@ -1,15 +1,17 @@
 from rest_framework import serializers
 from .models import Order, OrderItem
 from products.serializers import ProductSerializer
+from products.sparse import SparseFieldsMixin
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity', 'price', 'get_total']
+        field_sources = {'get_total': ['price', 'quantity']}
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -21,3 +23,14 @@ class OrderSerializer(serializers.ModelSerializer):
             'purchased_at', 'cancelled_at', 'cancellation_reason'
         ]
         read_only_fields = ['id', 'user', 'status', 'purchased_at', 'cancelled_at']
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """Order details sent with a whole-cart checkout; the total is computed from the cart"""
+    payment_method = serializers.CharField(max_length=20, default='COD')
+    delivery_charge = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
+    address = serializers.CharField(allow_blank=True, default='')
+    customer_name = serializers.CharField(max_length=255, allow_blank=True, default='')
+    customer_phone = serializers.CharField(max_length=15, allow_blank=True, default='')
+    customer_email = serializers.EmailField(allow_blank=True, default='')
+    card_details = serializers.JSONField(required=False, default=dict)
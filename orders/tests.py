@@ -1,3 +1,231 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cart.models import Cart, StockReservation
+from products.cache import get_catalog_version
+from products.models import Product
+from . import views
+from .models import Order, OrderItem
+
+User = get_user_model()
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.wheel = Product.objects.create(name='Wheel', price='99.00', stock=10)
+        self.horn = Product.objects.create(name='Horn', price='5.50', stock=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, product, quantity):
+        self.client.post('/api/cart/add/', {'product': product.id, 'quantity': quantity})
+
+    def checkout(self, **data):
+        return self.client.post('/api/orders/checkout/', {'address': 'Somewhere', **data}, format='json')
+
+    def test_cart_becomes_one_order(self):
+        self.add(self.wheel, 2)
+        self.add(self.horn, 3)
+        response = self.checkout(delivery_charge='40.00')
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get()
+        self.assertEqual(order.total, Decimal('254.50'))
+        self.assertEqual(
+            {(item.product_id, item.quantity, item.price) for item in OrderItem.objects.filter(order=order)},
+            {(self.wheel.id, 2, Decimal('99.00')), (self.horn.id, 3, Decimal('5.50'))},
+        )
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(
+            sorted(Product.objects.values_list('stock', 'reserved_stock')),
+            [(0, 0), (8, 0)],
+        )
+
+    def test_not_enough_stock_changes_nothing(self):
+        self.add(self.wheel, 2)
+        self.add(self.horn, 3)
+        Product.objects.filter(pk=self.horn.pk).update(stock=2)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['products'], [self.horn.id])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.count(), 2)
+        self.assertEqual(StockReservation.objects.count(), 2)
+        self.wheel.refresh_from_db()
+        self.assertEqual((self.wheel.stock, self.wheel.reserved_stock), (10, 2))
+
+    def test_empty_cart(self):
+        self.assertEqual(self.checkout().status_code, 400)
+
+    def test_gateway_failure_restores_cart_and_holds(self):
+        self.add(self.wheel, 2)
+        self.add(self.horn, 3)
+        with mock.patch.object(views.razorpay_client.order, 'create', side_effect=ConnectionError):
+            response = self.checkout(payment_method='RAZORPAY')
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(Order.objects.get().status, 'Cancelled')
+        self.assertEqual(
+            dict(Cart.objects.values_list('product_id', 'quantity')), {self.wheel.id: 2, self.horn.id: 3}
+        )
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('product_id', 'quantity')), {self.wheel.id: 2, self.horn.id: 3}
+        )
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'stock')), {self.wheel.id: 10, self.horn.id: 3}
+        )
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'reserved_stock')), {self.wheel.id: 2, self.horn.id: 3}
+        )
+
+    def test_rejects_invalid_delivery_charge(self):
+        self.add(self.wheel, 1)
+        for charge in ['-20', 'NaN', 'Infinity', 'free', '1.005']:
+            response = self.checkout(delivery_charge=charge)
+            self.assertEqual(response.status_code, 400, charge)
+            self.assertIn('delivery_charge', response.data)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.count(), 1)
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def order(self, quantity, **data):
+        return self.client.post('/api/orders/', {'product': self.product.id, 'quantity': quantity, **data}, format='json')
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock, self.product.reserved_stock
+
+    def test_takes_stock_including_own_hold(self):
+        self.client.post('/api/cart/add/', {'product': self.product.id, 'quantity': 2})
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw')
+        Cart.objects.create(user=other, product=self.product, quantity=1)
+        StockReservation.objects.create(user=other, product=self.product, quantity=1, expires_at='2100-01-01T00:00Z')
+        Product.objects.filter(pk=self.product.pk).update(reserved_stock=3)
+
+        self.assertEqual(self.order(5).status_code, 400)
+        self.assertEqual(self.stock(), (5, 3))
+        self.assertEqual(self.order(4).status_code, 201)
+        self.assertEqual(self.stock(), (1, 1))
+        self.assertFalse(StockReservation.objects.filter(user=self.user).exists())
+
+    def test_expired_holds_do_not_block(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw')
+        StockReservation.objects.create(
+            user=other, product=self.product, quantity=4, expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        Product.objects.filter(pk=self.product.pk).update(reserved_stock=4)
+        self.assertEqual(self.order(5).status_code, 201)
+        self.assertEqual(self.stock(), (0, 0))
+
+    def test_gateway_failure_cancels_order_and_restocks(self):
+        with mock.patch.object(views.razorpay_client.order, 'create', side_effect=ConnectionError):
+            response = self.order(2, payment_method='RAZORPAY', total='198.00')
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(Order.objects.get().status, 'Cancelled')
+        self.assertEqual(self.stock(), (5, 0))
+
+    def test_gateway_failure_restores_hold(self):
+        self.client.post('/api/cart/add/', {'product': self.product.id, 'quantity': 2})
+        with mock.patch.object(views.razorpay_client.order, 'create', side_effect=ConnectionError):
+            self.order(2, payment_method='RAZORPAY', total='198.00')
+        self.assertEqual(self.stock(), (5, 2))
+        self.assertEqual(StockReservation.objects.get(user=self.user).quantity, 2)
+
+    def test_sale_and_restock_change_product_validators(self):
+        url = f'/api/products/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with mock.patch.object(views.razorpay_client.order, 'create', side_effect=ConnectionError):
+            self.order(2, payment_method='RAZORPAY', total='198.00')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 5)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order(2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 3)
+
+    def test_rejects_non_positive_quantity(self):
+        for quantity in [0, -3, 'many']:
+            self.assertEqual(self.order(quantity).status_code, 400)
+        self.assertEqual(self.stock(), (5, 0))
+        self.assertFalse(Order.objects.exists())
+
+    def test_razorpay_order_id_is_saved(self):
+        with mock.patch.object(views.razorpay_client.order, 'create', return_value={'id': 'order_rzp'}):
+            response = self.order(1, payment_method='RAZORPAY', total='99.00')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get().razorpay_order_id, 'order_rzp')
+        self.assertEqual(self.stock(), (4, 0))
+
+
+class RestockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pw', is_staff=True)
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.order = Order.objects.create(user=self.user, total='198.00', address='Somewhere', status='Ordered')
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price='99.00')
+        self.client = APIClient()
+
+    def restocked(self, method, url, user, **data):
+        self.client.force_authenticate(user)
+        version = get_catalog_version()
+        # A stale copy saved back would undo sales made meanwhile
+        with mock.patch.object(Product, 'save') as save, self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        save.assert_not_called()
+        self.assertNotEqual(get_catalog_version(), version)
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def test_cancel_restocks_in_place(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=3)
+        url = f'/api/orders/{self.order.id}/cancel/'
+        self.assertEqual(self.restocked('post', url, self.user, reason='Changed my mind about it'), 5)
+        self.assertEqual(Order.objects.get().status, 'Cancelled')
+
+    def test_admin_delete_restocks_in_place(self):
+        url = f'/api/admin/orders/{self.order.id}/'
+        self.assertEqual(self.restocked('delete', url, self.admin), 7)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderSparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.order = Order.objects.create(user=self.user, total='198.00', address='Somewhere')
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price='99.00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_item_fields_without_product(self):
+        response = self.client.get('/api/orders/', {'fields': 'id,items.quantity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'id': self.order.id, 'items': [{'quantity': 2}]}])
 
-# Create your tests here.
+    def test_item_product_fields(self):
+        response = self.client.get('/api/orders/', {'fields': 'items.product.name'})
+        self.assertEqual(response.data, [{'items': [{'product': {'name': 'Wheel'}}]}])
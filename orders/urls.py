@@ -1,6 +1,7 @@
 from django.urls import path
 from .views import (
     OrderListCreateView, 
+    CheckoutView,
     CancelOrderAPIView, 
     VerifyPaymentAPIView,
     AdminOrderListView, 
@@ -10,6 +11,7 @@ from .views import (
 urlpatterns = [
     # User order endpoints
     path("orders/", OrderListCreateView.as_view(), name="orders"),
+    path("orders/checkout/", CheckoutView.as_view(), name="checkout"),
     path("orders/<int:order_id>/cancel/", CancelOrderAPIView.as_view(), name="cancel-order"),
     path("orders/verify-payment/", VerifyPaymentAPIView.as_view(), name="verify-payment"),
     
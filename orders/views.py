@@ -5,83 +5,249 @@ from django.utils import timezone
 from datetime import timedelta
 from .models import Order, OrderItem
 from products.models import Product
-from .serializers import OrderSerializer
+from cart.models import Cart
+from cart.reservations import (
+    InsufficientStock, consume as consume_reservation, consume_many as consume_reservations, hold_many,
+    release_expired_on,
+)
+from products.cache import bump_catalog_version
+from .serializers import CheckoutSerializer, OrderItemSerializer, OrderSerializer
 from django.db import transaction
 import razorpay
 from django.conf import settings
 import hmac
 import hashlib
 from rest_framework.permissions import IsAdminUser
+from django.db.models import Case, F, Prefetch, When
+from products.sparse import fields_from_request, sparse_queryset
 
 # Initialize Razorpay client
 razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
 
+def sparse_orders(queryset, fields):
+    """Trim the order columns, and the prefetched items and products, to a ?fields= spec"""
+    if not fields:
+        return queryset.prefetch_related('items__product')
+    queryset = sparse_queryset(queryset, OrderSerializer, fields)
+    if 'items' not in fields:
+        return queryset
+    items = OrderItem.objects.select_related('product')
+    items = sparse_queryset(items, OrderItemSerializer, fields['items'], 'order')
+    return queryset.prefetch_related(Prefetch('items', queryset=items))
+
+
+def take_stock(product_id, quantity, held=0):
+    """
+    Sell `quantity` units of a product, `held` of them from the buyer's
+    own cart hold, with one guarded UPDATE. The affected-row count decides
+    success, so buyers of the same product never queue behind a row lock
+    held for the whole request. Returns False, changing nothing, if fewer
+    units are available. updated_at is touched so that conditional GETs
+    of the product see the new stock.
+    """
+    return Product.objects.filter(
+        pk=product_id, stock__gte=F('reserved_stock') - held + quantity,
+    ).update(
+        stock=F('stock') - quantity, reserved_stock=F('reserved_stock') - held, updated_at=timezone.now(),
+    ) == 1
+
+
+def restock(order):
+    """
+    Put an order's units back with one relative UPDATE, so concurrent
+    sales of the same products are not overwritten. Call inside the
+    transaction that cancels or deletes the order.
+    """
+    items = dict(OrderItem.objects.filter(order=order).values_list('product_id', 'quantity'))
+    if not items:
+        return
+    Product.all_objects.filter(pk__in=items).update(stock=Case(
+        *[When(pk=pk, then=F('stock') + quantity) for pk, quantity in items.items()]
+    ), updated_at=timezone.now())
+    transaction.on_commit(bump_catalog_version)
+
+
+def create_razorpay_order(order, amount, held=None, cart_lines=None):
+    """
+    Razorpay order for a committed `order`, or None if the gateway call
+    fails. In that case the order is cancelled, its stock put back, and the
+    buyer gets back the holds (`held`) and cart lines (`cart_lines`), both
+    {product_id: quantity}, that placing it consumed.
+    """
+    try:
+        razorpay_order = razorpay_client.order.create({
+            "amount": int(amount * 100),  # in paise
+            "currency": "INR",
+            "receipt": f"order_{order.id}",
+            "payment_capture": 1,
+        })
+    except Exception as e:
+        print(f"Razorpay order creation failed for order {order.id}: {e}")
+        with transaction.atomic():
+            items = dict(OrderItem.objects.filter(order=order).values_list('product_id', 'quantity'))
+            Product.all_objects.filter(pk__in=items).update(stock=Case(
+                *[When(pk=pk, then=F('stock') + quantity) for pk, quantity in items.items()]
+            ), updated_at=timezone.now())
+            order.status = "Cancelled"
+            order.cancellation_reason = "Payment gateway unavailable"
+            order.cancelled_at = timezone.now()
+            order.save(update_fields=['status', 'cancellation_reason', 'cancelled_at'])
+            if cart_lines:
+                Cart.objects.add_quantities(order.user, cart_lines)
+        if held:
+            try:
+                hold_many(order.user, held)
+            except InsufficientStock:
+                # Someone bought the units meanwhile; the cart summary shows the lines as out of stock
+                pass
+        bump_catalog_version()
+        return None
+
+    order.razorpay_order_id = razorpay_order['id']
+    order.save(update_fields=['razorpay_order_id'])
+    return razorpay_order
+
+
 class OrderListCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
+        fields = fields_from_request(request)
         orders = Order.objects.filter(user=request.user).order_by('-purchased_at')
-        serializer = OrderSerializer(orders, many=True)
+        serializer = OrderSerializer(sparse_orders(orders, fields), many=True, fields=fields)
         return Response(serializer.data)
 
-    @transaction.atomic
     def post(self, request):
         user = request.user
         data = request.data
 
         product_id = data.get("product")
-        quantity = int(data.get("quantity", 1))
+        try:
+            quantity = int(data.get("quantity", 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity < 1:
+            return Response({"error": "Quantity must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
         payment_method = data.get("payment_method", "COD")
         delivery_charge = float(data.get("delivery_charge", 0))
         total = float(data.get("total", 0))
 
         try:
-            product = Product.objects.select_for_update().get(id=product_id)
+            product = Product.objects.only('id', 'price').get(id=product_id)
         except Product.DoesNotExist:
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        if product.stock < quantity:
-            return Response({"error": "Not enough stock"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Reduce stock
-        product.stock -= quantity
-        product.save(update_fields=['stock'])
-
-        order = Order.objects.create(
-            user=user,
-            total=total,
-            delivery_charge=delivery_charge,
-            payment_method=payment_method,
-            address=data.get("address", ""),
-            customer_name=data.get("customer_name", ""),
-            customer_phone=data.get("customer_phone", ""),
-            customer_email=data.get("customer_email", ""),
-            card_details=data.get("card_details", {}),
-        )
+        with transaction.atomic():
+            # Expired holds must not block the sale; the buyer's own cart
+            # hold is turned into it
+            release_expired_on([product.id])
+            held = consume_reservation(user, product.id)
+            if not take_stock(product.id, quantity, held):
+                transaction.set_rollback(True)
+                return Response({"error": "Not enough stock"}, status=status.HTTP_400_BAD_REQUEST)
+            transaction.on_commit(bump_catalog_version)
 
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            quantity=quantity,
-            price=product.price
-        )
+            order = Order.objects.create(
+                user=user,
+                total=total,
+                delivery_charge=delivery_charge,
+                payment_method=payment_method,
+                address=data.get("address", ""),
+                customer_name=data.get("customer_name", ""),
+                customer_phone=data.get("customer_phone", ""),
+                customer_email=data.get("customer_email", ""),
+                card_details=data.get("card_details", {}),
+            )
+
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                quantity=quantity,
+                price=product.price
+            )
 
-        # If Razorpay payment, create order
+        # If Razorpay payment, create order (outside the transaction: no stock is locked meanwhile)
         if payment_method == 'RAZORPAY':
-            razorpay_order = razorpay_client.order.create({
-                "amount": int(total * 100),  # in paise
-                "currency": "INR",
-                "receipt": f"order_{order.id}",
-                "payment_capture": 1,
-            })
-            order.razorpay_order_id = razorpay_order['id']
-            order.save()
+            razorpay_order = create_razorpay_order(order, total, held={product.id: held} if held else None)
+            if razorpay_order is None:
+                return Response({"error": "Payment gateway unavailable"}, status=status.HTTP_502_BAD_GATEWAY)
             return Response({"order": OrderSerializer(order).data, "razorpay_order": razorpay_order})
 
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class CheckoutView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        """
+        Turn the whole cart into one order: stock is taken with one guarded
+        UPDATE per product, in primary key order (so concurrent checkouts
+        cannot deadlock), items are bulk-created and the cart is cleared
+        with one DELETE.
+        """
+        user = request.user
+        serializer = CheckoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        payment_method = data["payment_method"]
+        delivery_charge = data["delivery_charge"]
+
+        with transaction.atomic():
+            lines = list(
+                Cart.objects.select_for_update().filter(user=user)
+                .values_list('id', 'product_id', 'quantity')
+            )
+            if not lines:
+                return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
+            quantities = {product_id: quantity for _, product_id, quantity in lines}
+
+            products = list(
+                Product.all_objects.filter(pk__in=quantities)
+                .only('id', 'price', 'is_deleted')
+                .order_by('pk')
+            )
+            unavailable = [product.id for product in products if product.is_deleted]
+            if unavailable:
+                transaction.set_rollback(True)
+                return Response(
+                    {"error": "Some products are no longer available", "products": unavailable},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # Expired holds must not block the sale; the buyer's own cart
+            # holds are turned into it
+            release_expired_on(list(quantities))
+            held = consume_reservations(user, list(quantities))
+            short = [
+                product.id for product in products
+                if not take_stock(product.id, quantities[product.id], held.get(product.id, 0))
+            ]
+            if short:
+                transaction.set_rollback(True)
+                return Response({"error": "Not enough stock", "products": short}, status=status.HTTP_400_BAD_REQUEST)
+            transaction.on_commit(bump_catalog_version)
+
+            subtotal = sum(product.price * quantities[product.id] for product in products)
+            order = Order.objects.create(user=user, total=subtotal + delivery_charge, **data)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=quantities[product.id], price=product.price)
+                for product in products
+            ])
+            Cart.objects.filter(pk__in=[pk for pk, _, _ in lines]).delete()
+
+        order = sparse_orders(Order.objects.filter(pk=order.pk), None).get()
+        if payment_method == 'RAZORPAY':
+            razorpay_order = create_razorpay_order(order, order.total, held=held, cart_lines=quantities)
+            if razorpay_order is None:
+                return Response({"error": "Payment gateway unavailable"}, status=status.HTTP_502_BAD_GATEWAY)
+            return Response({"order": OrderSerializer(order).data, "razorpay_order": razorpay_order})
+
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
 class CancelOrderAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
@@ -131,24 +297,13 @@ class CancelOrderAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Cancel the order
-        order.status = "Cancelled"
-        order.cancellation_reason = reason
-        order.cancelled_at = timezone.now()
-        order.save()
-        
-        # Restock products
-        try:
-            order_items = OrderItem.objects.filter(order=order)
-            if order_items.exists():
-                for item in order_items:
-                    item.product.stock += item.quantity
-                    item.product.save(update_fields=['stock'])
-            elif hasattr(order, 'product') and order.product:
-                order.product.stock += order.quantity
-                order.product.save(update_fields=['stock'])
-        except Exception as e:
-            print(f"Error restocking products: {e}")
+        # Cancel the order and restock its products
+        with transaction.atomic():
+            order.status = "Cancelled"
+            order.cancellation_reason = reason
+            order.cancelled_at = timezone.now()
+            order.save()
+            restock(order)
         
         return Response(
             {
@@ -231,8 +386,9 @@ class AdminOrderListView(APIView):
     
     def get(self, request):
         try:
-            orders = Order.objects.all().select_related('user').prefetch_related('items__product').order_by('-purchased_at')
-            serializer = OrderSerializer(orders, many=True)
+            fields = fields_from_request(request)
+            orders = Order.objects.all().order_by('-purchased_at')
+            serializer = OrderSerializer(sparse_orders(orders, fields), many=True, fields=fields)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:
             print(f"Error fetching admin orders: {e}")
@@ -247,8 +403,9 @@ class AdminOrderDetailView(APIView):
     
     def get(self, request, order_id):
         try:
-            order = Order.objects.select_related('user').prefetch_related('items__product').get(id=order_id)
-            serializer = OrderSerializer(order)
+            fields = fields_from_request(request)
+            order = sparse_orders(Order.objects.all(), fields).get(id=order_id)
+            serializer = OrderSerializer(order, fields=fields)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Order.DoesNotExist:
             return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -284,15 +441,9 @@ class AdminOrderDetailView(APIView):
             order = Order.objects.get(id=order_id)
             
             # Restock items before deleting
-            try:
-                order_items = OrderItem.objects.filter(order=order)
-                for item in order_items:
-                    item.product.stock += item.quantity
-                    item.product.save(update_fields=['stock'])
-            except Exception as e:
-                print(f"Error restocking during deletion: {e}")
-            
-            order.delete()
+            with transaction.atomic():
+                restock(order)
+                order.delete()
             return Response(
                 {"message": "Order deleted successfully"}, 
                 status=status.HTTP_200_OK
@@ -8,4 +8,8 @@ from .models import Product
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'category', 'price', 'rating', 'stock')
     search_fields = ('name', 'category')
-    list_filter = ('category',)
+    list_filter = ('category', 'is_deleted')
+
+    def get_queryset(self, request):
+        # Show trashed products too
+        return Product.all_objects.all()
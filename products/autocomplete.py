@@ -0,0 +1,277 @@
+"""
+In-memory, typo-tolerant autocomplete over product names and brands.
+
+One index lives in each worker process. It is loaded from the database
+on first use, patched in place by the Product signals for changes made
+by this process, and rebuilt when the shared names version (bumped only
+when product names or brands change, see products.signals) shows that
+another process changed them. Rebuilds run in a background thread while
+lookups keep using the old index; only the very first load blocks.
+Lookups never hit the database.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+
+from django.db import connection
+
+from .cache import get_names_version
+
+# Seconds between checks of the shared catalog version
+SYNC_INTERVAL = 30
+MIN_SIMILARITY = 0.3
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._checked_at = 0.0
+        self._rebuilding = False
+        # While True, _index_key appends and load() sorts once at the end
+        self._bulk = False
+        self._clear()
+
+    def _clear(self):
+        # (kind, normalized text) -> {'text', 'kind', 'ids'}
+        self._suggestions = {}
+        # product id -> suggestion keys it contributes to
+        self._product_keys = {}
+        # sorted (search key, suggestion key); one search key per word start
+        self._prefixes = []
+        # word -> number of suggestions containing it
+        self._words = Counter()
+        # trigram -> words, used to correct misspelled query words
+        self._trigrams = {}
+
+    # ------------------------------------------------------------------
+    # Loading and incremental maintenance
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Build a new index from the database and swap it in"""
+        from .models import Product
+
+        version = get_names_version()
+        rows = Product.objects.values_list('id', 'name', 'brand').iterator(chunk_size=5000)
+        fresh = AutocompleteIndex()
+        fresh._bulk = True
+        for pk, name, brand in rows:
+            fresh._add_product(pk, name, brand)
+        fresh._prefixes.sort()
+        with self._lock:
+            self._suggestions = fresh._suggestions
+            self._product_keys = fresh._product_keys
+            self._prefixes = fresh._prefixes
+            self._words = fresh._words
+            self._trigrams = fresh._trigrams
+            self._loaded = True
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def _reload_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def rebuild():
+            try:
+                self.load()
+            finally:
+                self._rebuilding = False
+                connection.close()
+
+        threading.Thread(target=rebuild, name='autocomplete-rebuild', daemon=True).start()
+
+    def invalidate(self):
+        """Rebuild on the next lookup (e.g. after bulk writes); the current index is served meanwhile"""
+        with self._lock:
+            self._version = None
+            self._checked_at = 0.0
+
+    def update_product(self, product, version=None):
+        """
+        Apply a product save/soft delete/restore made in this process.
+        `version` is the names version its bump returned.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove_product(product.pk)
+            if not product.is_deleted:
+                self._add_product(product.pk, product.name, product.brand)
+            self._advance(version)
+
+    def remove_product(self, pk, version=None):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove_product(pk)
+            self._advance(version)
+
+    def _advance(self, version):
+        """
+        Move to `version` only if it directly follows the one this index
+        was synced to. Otherwise another process changed names in between:
+        keep the old version so the next lookup rebuilds the index.
+        """
+        if version is None:
+            return
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+        else:
+            self._checked_at = 0.0
+
+    def _add_product(self, pk, name, brand):
+        keys = []
+        for kind, text in (('product', name), ('brand', brand)):
+            normalized = normalize(text or '')
+            if not normalized:
+                continue
+            key = (kind, normalized)
+            suggestion = self._suggestions.get(key)
+            if suggestion is None:
+                suggestion = {'text': text.strip(), 'kind': kind, 'ids': set()}
+                self._suggestions[key] = suggestion
+                self._index_key(key)
+            suggestion['ids'].add(pk)
+            keys.append(key)
+        self._product_keys[pk] = keys
+
+    def _remove_product(self, pk):
+        for key in self._product_keys.pop(pk, []):
+            suggestion = self._suggestions[key]
+            suggestion['ids'].discard(pk)
+            if not suggestion['ids']:
+                del self._suggestions[key]
+                self._unindex_key(key)
+
+    def _search_keys(self, key):
+        words = key[1].split(' ')
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def _index_key(self, key):
+        for search_key in self._search_keys(key):
+            if self._bulk:
+                self._prefixes.append((search_key, key))
+            else:
+                bisect.insort(self._prefixes, (search_key, key))
+        for word in set(key[1].split(' ')):
+            if not self._words[word]:
+                for gram in trigrams(word):
+                    self._trigrams.setdefault(gram, set()).add(word)
+            self._words[word] += 1
+
+    def _unindex_key(self, key):
+        for search_key in self._search_keys(key):
+            i = bisect.bisect_left(self._prefixes, (search_key, key))
+            if i < len(self._prefixes) and self._prefixes[i] == (search_key, key):
+                del self._prefixes[i]
+        for word in set(key[1].split(' ')):
+            self._words[word] -= 1
+            if self._words[word] > 0:
+                continue
+            del self._words[word]
+            for gram in trigrams(word):
+                words = self._trigrams.get(gram)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._trigrams[gram]
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            self.load()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < SYNC_INTERVAL:
+            return
+        self._checked_at = now
+        if get_names_version() != self._version:
+            self._reload_in_background()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """
+        Prefix matches on any word start of a name or brand. If that does
+        not fill the list, misspelled query words are replaced by their
+        closest indexed word (trigram similarity) and the lookup is retried.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            results = self._prefix_matches(query, limit, [])
+            if len(results) < limit:
+                corrected = self._correct(query)
+                if corrected != query:
+                    results = self._prefix_matches(corrected, limit, results)
+            return [self._serialize(self._suggestions[key]) for key in results]
+
+    def _prefix_matches(self, query, limit, results):
+        results = list(results)
+        i = bisect.bisect_left(self._prefixes, (query,))
+        while i < len(self._prefixes) and len(results) < limit:
+            search_key, key = self._prefixes[i]
+            if not search_key.startswith(query):
+                break
+            if key not in results:
+                results.append(key)
+            i += 1
+        return results
+
+    def _correct(self, query):
+        words = query.split(' ')
+        # The last word may still be being typed, so a known prefix is fine
+        corrected = [self._closest_word(w) for w in words[:-1]]
+        last = words[-1]
+        if not self._has_word_prefix(last):
+            last = self._closest_word(last)
+        return ' '.join(corrected + [last])
+
+    def _has_word_prefix(self, prefix):
+        i = bisect.bisect_left(self._prefixes, (prefix,))
+        return i < len(self._prefixes) and self._prefixes[i][0].startswith(prefix)
+
+    def _closest_word(self, word):
+        if word in self._words or len(word) < 3:
+            return word
+        word_grams = trigrams(word)
+        overlap = Counter()
+        for gram in word_grams:
+            for candidate in self._trigrams.get(gram, ()):
+                overlap[candidate] += 1
+        best, best_score = word, MIN_SIMILARITY
+        for candidate, shared in overlap.items():
+            score = shared / (len(word_grams) + len(trigrams(candidate)) - shared)
+            if score > best_score or (score == best_score and candidate < best):
+                best, best_score = candidate, score
+        return best
+
+    def _serialize(self, suggestion):
+        data = {'text': suggestion['text'], 'type': suggestion['kind']}
+        if suggestion['kind'] == 'product':
+            data['product_id'] = min(suggestion['ids'])
+        return data
+
+
+autocomplete_index = AutocompleteIndex()
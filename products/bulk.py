@@ -0,0 +1,246 @@
+"""
+Streaming bulk import/export of products as CSV or NDJSON.
+
+Rows are read lazily, validated with the model fields' own validators
+and written in batches with bulk_create/bulk_update, one transaction per
+batch. A row that fails validation is reported and skipped without
+affecting the rest of its batch.
+"""
+import csv
+import io
+import json
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .autocomplete import autocomplete_index
+from .cache import bump_catalog_version, bump_names_version
+from .models import Product
+
+FORMATS = ('csv', 'ndjson')
+IMPORT_FIELDS = ['name', 'brand', 'color', 'description', 'price', 'category', 'stock']
+EXPORT_FIELDS = ['id'] + IMPORT_FIELDS
+REQUIRED_FIELDS = ['name', 'price']
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+_price_field = Product._meta.get_field('price')
+CENT = Decimal(10) ** -_price_field.decimal_places
+MAX_PRICE = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places) - CENT
+
+
+class PriceOutOfRange(Exception):
+    pass
+
+
+def guess_format(filename=None, content_type=None):
+    if content_type and ('ndjson' in content_type or 'jsonlines' in content_type):
+        return 'ndjson'
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def _text_lines(stream):
+    """Decode a binary line iterator (upload, request body, file) lazily"""
+    for line in stream:
+        yield line.decode('utf-8-sig') if isinstance(line, bytes) else line
+
+
+def read_rows(stream, file_format):
+    """Yield (row number, dict or None, error) for every record in the stream"""
+    lines = _text_lines(stream)
+    if file_format == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                # Decimal keeps numeric prices exact; a float would fail
+                # DecimalField's digit checks
+                row = json.loads(line, parse_float=Decimal)
+            except ValueError as e:
+                yield number, None, {'row': f'Invalid JSON: {e}'}
+                continue
+            if not isinstance(row, dict):
+                yield number, None, {'row': 'Each line must be a JSON object'}
+                continue
+            yield number, row, None
+    else:
+        reader = csv.DictReader(lines)
+        for number, row in enumerate(reader, start=1):
+            yield number, row, None
+
+
+class ProductImporter:
+    """
+    Creates rows without an `id` and updates rows with one. Only the
+    columns present in a row are written; `image` is not importable.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.fields = {name: Product._meta.get_field(name) for name in IMPORT_FIELDS}
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+
+        if self.created or self.updated:
+            bump_catalog_version()
+            bump_names_version()
+            autocomplete_index.invalidate()
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+    def add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def clean_row(self, row, partial):
+        values, errors = {}, {}
+        for name, field in self.fields.items():
+            raw = row.get(name)
+            if raw is None or raw == '':
+                if not partial and name in REQUIRED_FIELDS:
+                    errors[name] = ['This field is required.']
+                continue
+            try:
+                values[name] = field.clean(raw, None)
+            except ValidationError as e:
+                errors[name] = e.messages
+        return values, errors
+
+    def import_batch(self, batch):
+        ids = {}
+        for number, row, error in batch:
+            if row and row.get('id') not in (None, ''):
+                try:
+                    ids[number] = int(row['id'])
+                except (TypeError, ValueError):
+                    pass
+        existing = Product.all_objects.in_bulk(list(ids.values()))
+
+        to_create, to_update, update_fields = [], [], set()
+        now = timezone.now()
+        for number, row, error in batch:
+            if error:
+                self.add_error(number, error)
+                continue
+            has_id = row.get('id') not in (None, '')
+            if has_id and number not in ids:
+                self.add_error(number, {'id': ['A valid integer is required.']})
+                continue
+            if has_id and ids[number] not in existing:
+                self.add_error(number, {'id': [f'Product {ids[number]} does not exist.']})
+                continue
+
+            values, errors = self.clean_row(row, partial=has_id)
+            if errors:
+                self.add_error(number, errors)
+                continue
+
+            if has_id:
+                product = existing[ids[number]]
+                for name, value in values.items():
+                    setattr(product, name, value)
+                product.updated_at = now
+                update_fields.update(values)
+                to_update.append(product)
+            else:
+                to_create.append(Product(**values))
+
+        with transaction.atomic():
+            if to_create:
+                Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            if to_update:
+                # `existing` comes from all_objects, so trashed products are updated too
+                Product.all_objects.bulk_update(
+                    to_update, sorted(update_fields) + ['updated_at'], batch_size=self.batch_size
+                )
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+
+def export_rows(file_format, queryset=None):
+    """Yield the catalog as CSV or NDJSON text chunks without loading it in memory"""
+    if queryset is None:
+        queryset = Product.objects.order_by('id')
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=2000)
+
+    if file_format == 'ndjson':
+        for values in rows:
+            record = dict(zip(EXPORT_FIELDS, values))
+            record['price'] = str(record['price'])
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for count, values in enumerate(rows, start=1):
+        writer.writerow(values)
+        if count % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def bulk_adjust(ids=None, category=None, brand=None, stock_delta=None, price=None, price_percent=None):
+    """
+    Apply a stock delta and/or a price change to every selected live product
+    with one UPDATE ... SET stock = stock + delta statement. Products that
+    do not have enough stock for a negative delta are left untouched.
+    Raises PriceOutOfRange, changing nothing, if a price would not fit.
+    """
+    products = Product.objects.all()
+    if ids:
+        products = products.filter(pk__in=ids)
+    if category:
+        products = products.filter(category=category)
+    if brand:
+        products = products.filter(brand=brand)
+    matched = products.count()
+
+    updates = {'updated_at': timezone.now()}
+    if stock_delta:
+        updates['stock'] = F('stock') + stock_delta
+        if stock_delta < 0:
+            products = products.filter(stock__gte=-stock_delta)
+    if price is not None:
+        updates['price'] = price
+    elif price_percent:
+        factor = 1 + Decimal(price_percent) / 100
+        updates['price'] = Round(F('price') * factor, 2)
+
+    with transaction.atomic():
+        if price_percent and price_percent > 0:
+            # An overflowing price would abort the UPDATE with a database error
+            highest = products.aggregate(highest=Max('price'))['highest']
+            if highest is not None and (highest * factor).quantize(CENT, ROUND_HALF_UP) > MAX_PRICE:
+                raise PriceOutOfRange(f'Prices would exceed {MAX_PRICE}')
+        updated = products.update(**updates)
+    if updated:
+        bump_catalog_version()
+    return {'matched': matched, 'updated': updated, 'skipped': matched - updated}
@@ -0,0 +1,114 @@
+"""
+Versioned response cache for the public product catalog.
+
+Every cache key embeds the current catalog version, so invalidating the
+whole catalog is a single counter increment: entries written under an
+older version are simply never read again and age out on their own.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'catalog:version'
+# Only changes when product names/brands do (see products.autocomplete)
+NAMES_VERSION_KEY = 'catalog:names-version'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+# How long a worker that lost the rebuild race waits for the winner
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+def get_catalog_version(key=VERSION_KEY):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(key=VERSION_KEY):
+    """Invalidate every cached catalog response and return the new version"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def get_names_version():
+    return get_catalog_version(NAMES_VERSION_KEY)
+
+
+def bump_names_version():
+    """Tell every process that product names/brands changed; returns the new version"""
+    return bump_catalog_version(NAMES_VERSION_KEY)
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_catalog_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0,
+    }
+
+
+def catalog_cache_key(name, request):
+    params = sorted(request.query_params.lists())
+    raw = f'{request.get_host()}|{params}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'catalog:{get_catalog_version()}:{name}:{digest}'
+
+
+def get_or_build(name, request, build):
+    """
+    Return the cached payload for this request, building it with `build()`
+    on a miss. Only one worker rebuilds a given key at a time; the others
+    wait for its result instead of all hitting the database at once.
+    A `build()` result of None (e.g. not found) is returned but not cached.
+    """
+    key = catalog_cache_key(name, request)
+    data = cache.get(key, _MISSING)
+    if data is not _MISSING:
+        _incr(HITS_KEY)
+        return data
+
+    _incr(MISSES_KEY)
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            data = build()
+            if data is not None:
+                cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+            return data
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        data = cache.get(key, _MISSING)
+        if data is not _MISSING:
+            return data
+        if cache.get(lock_key) is None:
+            break
+    return build()
@@ -0,0 +1,70 @@
+"""
+Cheap HTTP validators (ETag / Last-Modified) for the catalog endpoints.
+
+Validators are computed from updated_at and row counts, so answering a
+conditional request with 304 costs one indexed aggregate query and never
+serializes a product.
+"""
+import hashlib
+
+from django.db.models import Count, Max, Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Product
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+def catalog_validators(request):
+    """
+    ETag and Last-Modified for the product list.
+
+    max(updated_at) is taken over trashed rows as well: soft_delete() and
+    restore() touch updated_at, so moving a product in or out of the
+    trash still changes the validator.
+    """
+    stats = Product.all_objects.aggregate(
+        last_modified=Max('updated_at'),
+        live=Count('id', filter=Q(is_deleted=False)),
+    )
+    last_modified = stats['last_modified']
+    params = sorted(request.query_params.lists())
+    etag = _etag('list', last_modified and last_modified.isoformat(), stats['live'], params)
+    return etag, last_modified
+
+
+def product_validators(pk, *extra):
+    """
+    ETag and Last-Modified for a single live product, or (None, None) if
+    missing. `extra` folds anything else the response depends on into the ETag.
+    """
+    updated_at = (
+        Product.objects.filter(pk=pk)
+        .values_list('updated_at', flat=True)
+        .first()
+    )
+    if updated_at is None:
+        return None, None
+    return _etag('detail', pk, updated_at.isoformat(), *extra), updated_at
+
+
+def not_modified_response(request, etag, last_modified):
+    """Return a 304 response if the client's copy is still fresh, else None"""
+    if etag is None:
+        return None
+    return get_conditional_response(
+        request._request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
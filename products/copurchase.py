@@ -0,0 +1,124 @@
+"""
+"Frequently bought together" recommendations from order history.
+
+The co-occurrence matrix (how many orders contain both product i and
+product j) is built with NumPy over the (order_id, product_id) pairs of
+every order item, kept sparse as sorted pair codes, and reduced to the
+top K partners per product. The result is stored one row per product in
+ProductCoPurchase, so a request needs a single primary-key lookup.
+"""
+from itertools import chain
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Product, ProductCoPurchase
+
+DEFAULT_TOP_K = 20
+# Bulk/B2B orders would dominate the matrix (n^2 pairs each), so skip them
+MAX_BASKET_SIZE = 50
+MIN_SHARED_ORDERS = 1
+
+
+def order_item_pairs():
+    """(order_id, product_id) for every order item of a live product, as an (n, 2) array"""
+    from orders.models import OrderItem
+
+    rows = (
+        OrderItem.objects.filter(product__is_deleted=False)
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=10000)
+    )
+    flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64)
+    return flat.reshape(-1, 2)
+
+
+def co_occurrence(pairs, max_basket_size=MAX_BASKET_SIZE):
+    """
+    Sparse co-occurrence counts as (product_a, product_b, orders) arrays,
+    one entry per ordered pair a != b bought together at least once.
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if not len(pairs):
+        return empty, empty, empty
+
+    # One entry per (order, product), grouped by order
+    pairs = np.unique(pairs, axis=0)
+    _, starts, sizes = np.unique(pairs[:, 0], return_index=True, return_counts=True)
+    keep = (sizes > 1) & (sizes <= max_basket_size)
+    if not keep.any():
+        return empty, empty, empty
+    starts, sizes = starts[keep], sizes[keep]
+
+    # Every (i, j) position pair inside each kept basket, without materialising the baskets
+    item_index = np.repeat(starts, sizes) + _ranges(sizes)
+    item_size = np.repeat(sizes, sizes)
+    item_start = np.repeat(starts, sizes)
+    left = np.repeat(item_index, item_size)
+    right = np.repeat(item_start, item_size) + _ranges(item_size)
+    distinct = left != right
+    a = pairs[left[distinct], 1]
+    b = pairs[right[distinct], 1]
+
+    # Count identical product pairs across orders
+    product_ids, dense = np.unique(np.concatenate([a, b]), return_inverse=True)
+    width = len(product_ids)
+    codes, counts = np.unique(dense[:len(a)] * width + dense[len(a):], return_counts=True)
+    return product_ids[codes // width], product_ids[codes % width], counts
+
+
+def _ranges(sizes):
+    """concatenate([arange(n) for n in sizes]) without a Python loop"""
+    offsets = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return np.arange(offsets.size) - offsets
+
+
+def top_k(a, b, counts, k=DEFAULT_TOP_K, min_count=MIN_SHARED_ORDERS):
+    """{product_id: [related ids, most shared orders first, ties by lower id]}"""
+    mask = counts >= min_count
+    a, b, counts = a[mask], b[mask], counts[mask]
+    order = np.lexsort((b, -counts, a))
+    a, b = a[order], b[order]
+    _, sizes = np.unique(a, return_counts=True)
+    rank = _ranges(sizes)
+    keep = rank < k
+
+    related = {}
+    for product_id, related_id in zip(a[keep].tolist(), b[keep].tolist()):
+        related.setdefault(product_id, []).append(related_id)
+    return related
+
+
+def refresh_copurchase_index(k=DEFAULT_TOP_K, min_count=MIN_SHARED_ORDERS,
+                             max_basket_size=MAX_BASKET_SIZE, batch_size=1000):
+    """Rebuild ProductCoPurchase from scratch in one transaction"""
+    pairs = order_item_pairs()
+    related = top_k(*co_occurrence(pairs, max_basket_size), k=k, min_count=min_count)
+
+    now = timezone.now()
+    rows = [
+        ProductCoPurchase(product_id=product_id, related_ids=ids, refreshed_at=now)
+        for product_id, ids in related.items()
+    ]
+    with transaction.atomic():
+        ProductCoPurchase.objects.all().delete()
+        ProductCoPurchase.objects.bulk_create(rows, batch_size=batch_size)
+    bump_catalog_version()
+    return {'order_items': len(pairs), 'products': len(rows)}
+
+
+def bought_together(product_id, limit=None, queryset=None):
+    """Live products most often bought with `product_id`, best first"""
+    ids = (
+        ProductCoPurchase.objects.filter(product_id=product_id)
+        .values_list('related_ids', flat=True)
+        .first()
+    )
+    if not ids:
+        return []
+    if queryset is None:
+        queryset = Product.objects.all()
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products][:limit]
@@ -0,0 +1,146 @@
+"""
+Read-only fast path for product list responses.
+
+Most of the time spent rendering a product page goes into DRF's
+field-by-field ModelSerializer machinery, not into SQL. Here rows are
+read with values_list(), turned into dicts by a mapper compiled once per
+field set, and encoded with orjson when it is installed. The bytes are
+identical to ProductSerializer output rendered by DRF's JSONRenderer;
+`manage.py benchmark_product_serialization` checks that and times both.
+"""
+import decimal
+import json
+from functools import lru_cache
+
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder gives the same bytes
+    orjson = None
+
+from .models import Product
+from .serializers import ProductSerializer
+
+# Serializer field -> (columns it reads, expression over those columns).
+# {0}, {1}... are the field's columns in order; `tz` is the current timezone.
+FIELD_SPECS = {
+    'id': (['id'], '{0}'),
+    'name': (['name'], '{0}'),
+    'brand': (['brand'], '{0}'),
+    'color': (['color'], '{0}'),
+    'description': (['description'], '{0}'),
+    'price': (['price'], 'price_str({0})'),
+    'category': (['category'], '{0}'),
+    'image': (['image'], 'url({0})'),
+    'image_variants': (['image', 'image_thumbnail', 'image_medium'], 'variants({0}, {1}, {2})'),
+    'rating': (['rating'], 'rating_str({0})'),
+    'stock': (['stock'], '{0}'),
+    'created_at': (['created_at'], 'dt({0}, tz)'),
+    'updated_at': (['updated_at'], 'dt({0}, tz)'),
+    'review_count': (['review_count'], '{0}'),
+    'average_rating': (['rating'], 'float({0})'),
+    'is_deleted': (['is_deleted'], '{0}'),
+    'deleted_at': (['deleted_at'], 'dt({0}, tz)'),
+}
+# The cursor paginator reads these from the first two columns of every row
+LEADING_COLUMNS = ['id', 'created_at']
+
+
+def _decimal_formatter(name):
+    """Same quantize-then-format as rest_framework.fields.DecimalField"""
+    field = Product._meta.get_field(name)
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = field.max_digits
+
+    def format_decimal(value):
+        if value is None:
+            return ''
+        return f'{value.quantize(quantum, context=context):f}'
+    return format_decimal
+
+
+def _datetime(value, tz):
+    if not value:
+        return None
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _url_builder():
+    storage = Product._meta.get_field('image').storage
+    base_url = getattr(storage, 'base_url', None)
+    # FileSystemStorage.url() is urljoin(base_url, filepath_to_uri(name)),
+    # which is plain concatenation unless the name has dot segments
+    concatenate = (
+        isinstance(storage, FileSystemStorage) and base_url and base_url.endswith('/')
+    )
+
+    def url(name):
+        if not name:
+            return None
+        if concatenate and not name.startswith('.') and '/.' not in name:
+            return base_url + filepath_to_uri(name).lstrip('/')
+        return storage.url(name)
+
+    def variants(image, thumbnail, medium):
+        original = url(image)
+        return {'thumbnail': url(thumbnail) or original, 'medium': url(medium) or original}
+    return url, variants
+
+
+def supported():
+    """False if ProductSerializer gained a field this module does not know about"""
+    return set(ProductSerializer.Meta.fields) == set(FIELD_SPECS)
+
+
+@lru_cache(maxsize=64)
+def _compile(names):
+    columns = list(LEADING_COLUMNS)
+    items = []
+    for name in names:
+        field_columns, expression = FIELD_SPECS[name]
+        for column in field_columns:
+            if column not in columns:
+                columns.append(column)
+        args = [f'r[{columns.index(column)}]' for column in field_columns]
+        items.append(f'{name!r}: {expression.format(*args)}')
+
+    url, variants = _url_builder()
+    namespace = {
+        'price_str': _decimal_formatter('price'),
+        'rating_str': _decimal_formatter('rating'),
+        'dt': _datetime,
+        'url': url,
+        'variants': variants,
+    }
+    source = f"def map_rows(rows, tz):\n    return [{{{', '.join(items)}}} for r in rows]\n"
+    exec(compile(source, '<product row mapper>', 'exec'), namespace)
+    return columns, namespace['map_rows']
+
+
+def row_mapper(fields=None):
+    """
+    (columns, map_rows) for a sparse `fields` tree, or every field.
+    Feed map_rows() the values_list(*columns) rows.
+    """
+    names = tuple(
+        name for name in ProductSerializer.Meta.fields if fields is None or name in fields
+    )
+    columns, map_rows = _compile(names)
+    return columns, lambda rows: map_rows(rows, timezone.get_current_timezone())
+
+
+def dumps(data):
+    """Encode like rest_framework.renderers.JSONRenderer with the default settings"""
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+    # JSONRenderer escapes these so the output is also valid JavaScript
+    return body.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,118 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, CharField, Count, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = [
+    ('0-1000', None, Decimal('1000')),
+    ('1000-5000', Decimal('1000'), Decimal('5000')),
+    ('5000-10000', Decimal('5000'), Decimal('10000')),
+    ('10000-25000', Decimal('10000'), Decimal('25000')),
+    ('25000+', Decimal('25000'), None),
+]
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def _list_param(params, name):
+    """Accept both ?brand=a,b and ?brand=a&brand=b"""
+    values = []
+    for raw in params.getlist(name):
+        values.extend(v.strip() for v in raw.split(',') if v.strip())
+    return values
+
+
+def _price_param(params, name):
+    raw = params.get(name)
+    if raw in (None, ''):
+        return None
+    try:
+        value = Decimal(raw)
+    except InvalidOperation:
+        value = None
+    # NaN and Infinity parse, but are no price
+    if value is None or not value.is_finite():
+        raise ValidationError({name: 'A valid number is required.'})
+    return value
+
+
+def _has_price_filter(params):
+    return any(params.get(name) not in (None, '') for name in ('min_price', 'max_price'))
+
+
+def filter_products(queryset, params, exclude=None):
+    """
+    Apply category/color/brand/price/stock filters from query params,
+    except the filter of the facet named by `exclude`.
+    """
+    for field in ('category', 'color', 'brand'):
+        values = _list_param(params, field)
+        if values and field != exclude:
+            queryset = queryset.filter(**{f'{field}__in': values})
+
+    min_price = _price_param(params, 'min_price')
+    max_price = _price_param(params, 'max_price')
+    if exclude != 'price':
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+
+    if params.get('in_stock', '').lower() in TRUE_VALUES:
+        queryset = queryset.filter(stock__gt=0)
+    return queryset
+
+
+def wants_facets(params):
+    return params.get('facets', '').lower() in TRUE_VALUES
+
+
+def price_bucket_expression():
+    whens = []
+    for label, low, high in PRICE_BUCKETS:
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        whens.append(When(condition, then=Value(label)))
+    return Case(*whens, output_field=CharField())
+
+
+def facet_counts(queryset, params):
+    """
+    Per category/color/brand and price bucket counts for `queryset`
+    filtered by `params`. Each facet is counted with every filter except
+    its own, so the values a facet is filtered by do not hide the other
+    values of that facet. Facets without an active filter share one
+    GROUP BY over the fully filtered queryset; each active one costs
+    another.
+    """
+    facets = {
+        'category': {},
+        'color': {},
+        'brand': {},
+        'price': {label: 0 for label, _, _ in PRICE_BUCKETS},
+    }
+    active = {field for field in ('category', 'color', 'brand') if _list_param(params, field)}
+    if _has_price_filter(params):
+        active.add('price')
+
+    groups = [(facet, [facet]) for facet in sorted(active)]
+    if len(active) < len(facets):
+        groups.append((None, [facet for facet in facets if facet not in active]))
+
+    for exclude, names in groups:
+        columns = [name for name in names if name != 'price']
+        rows = filter_products(queryset, params, exclude=exclude).order_by()
+        if 'price' in names:
+            rows = rows.annotate(price_bucket=price_bucket_expression())
+            columns.append('price_bucket')
+        for row in rows.values(*columns).annotate(n=Count('id')):
+            for name in names:
+                if name == 'price':
+                    facets['price'][row['price_bucket']] += row['n']
+                else:
+                    facets[name][row[name]] = facets[name].get(row[name], 0) + row['n']
+    return facets
@@ -0,0 +1,105 @@
+"""
+Resized WebP derivatives of product images.
+
+Originals are whatever the admin uploaded (often several megabytes), so
+list pages are served a small thumbnail and detail pages a medium variant.
+Derivatives are generated off the request path, in a small per-process
+thread pool, once the transaction that saved the image has committed.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# variant -> (model field, bounding box)
+VARIANTS = {
+    'thumbnail': ('image_thumbnail', (320, 320)),
+    'medium': ('image_medium', (800, 800)),
+}
+WEBP_QUALITY = 80
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PRODUCT_IMAGE_WORKERS,
+            thread_name_prefix='product-images',
+        )
+    return _executor
+
+
+def schedule_derivatives(product_id):
+    """Queue derivative generation for after the current transaction commits"""
+    def submit():
+        if settings.PRODUCT_IMAGE_ASYNC:
+            _get_executor().submit(_run_in_worker, product_id)
+        else:
+            generate_derivatives(product_id)
+
+    transaction.on_commit(submit)
+
+
+def _run_in_worker(product_id):
+    close_old_connections()
+    try:
+        generate_derivatives(product_id)
+    except Exception:
+        logger.exception('Generating image derivatives failed for product %s', product_id)
+    finally:
+        close_old_connections()
+
+
+def derivative_name(source_name, variant):
+    stem = posixpath.splitext(posixpath.basename(source_name))[0]
+    return f'products/derivatives/{stem}_{variant}.webp'
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(product_id):
+    """Write every variant of the product's current image and record their names"""
+    from .cache import bump_catalog_version
+    from .models import Product
+
+    product = Product.all_objects.filter(pk=product_id).only('id', 'image').first()
+    if product is None:
+        return
+
+    source = product.image.name if product.image else None
+    updates = {field: None for field, _ in VARIANTS.values()}
+    if source:
+        storage = product.image.storage
+        with storage.open(source, 'rb') as fh:
+            image = ImageOps.exif_transpose(Image.open(fh))
+            image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        for variant, (field, size) in VARIANTS.items():
+            # Content-addressed: re-rendering an unchanged image rewrites nothing
+            updates[field] = storage.save(derivative_name(source, variant), render_variant(image, size))
+
+    # Only record the variants if the image was not replaced meanwhile; touch
+    # updated_at so conditional GETs do not keep answering 304 without them
+    unchanged = Q(image=source) if source else Q(image__isnull=True) | Q(image='')
+    updated = Product.all_objects.filter(unchanged, pk=product_id).update(**updates, updated_at=timezone.now())
+    if updated:
+        bump_catalog_version()
@@ -0,0 +1,69 @@
+"""
+Related data embedded in the product detail response via
+``?include=reviews,related,wishlist_status``.
+
+Each include costs one or two bounded queries. reviews and related are shared by
+every visitor and cached with the product; wishlist_status is per user
+and is computed on every request.
+"""
+from rest_framework.exceptions import ValidationError
+
+from .copurchase import bought_together
+from .filters import _list_param
+from .models import Product
+from .serializers import ProductSerializer
+from .sparse import sparse_queryset
+
+INCLUDES = ('reviews', 'related', 'wishlist_status')
+REVIEWS_LIMIT = 10
+RELATED_LIMIT = 8
+
+
+def parse_includes(params):
+    includes = set(_list_param(params, 'include'))
+    unknown = includes.difference(INCLUDES)
+    if unknown:
+        raise ValidationError({
+            'include': f"Unknown include(s): {', '.join(sorted(unknown))}. "
+                       f"Choose from {', '.join(INCLUDES)}."
+        })
+    return includes
+
+
+def latest_reviews(product, limit=REVIEWS_LIMIT):
+    """The newest reviews with their authors, in one query"""
+    from reviews.models import Review
+    from reviews.serializers import ReviewSerializer
+
+    reviews = (
+        Review.objects.filter(product=product)
+        .select_related('user')
+        .order_by('-created_at', '-id')[:limit]
+    )
+    return ReviewSerializer(reviews, many=True).data
+
+
+def related_products(product, fields=None, limit=RELATED_LIMIT):
+    """
+    Products frequently bought together with this one, topped up with the
+    best-rated live products from the same category. Trimmed like the
+    product itself.
+    """
+    live = sparse_queryset(Product.objects.all(), ProductSerializer, fields)
+    related = bought_together(product.pk, limit, queryset=live)
+    if len(related) < limit:
+        same_category = (
+            live.filter(category=product.category)
+            .exclude(pk__in=[product.pk] + [p.pk for p in related])
+            .order_by('-rating', '-review_count', '-id')
+        )
+        related += same_category[:limit - len(related)]
+    return ProductSerializer(related, many=True, fields=fields).data
+
+
+def wishlist_status(user, product_id):
+    if not user.is_authenticated:
+        return False
+    from wishlist.models import Wishlist
+
+    return Wishlist.objects.filter(user=user, product_id=product_id).exists()
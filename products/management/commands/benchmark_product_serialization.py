@@ -0,0 +1,92 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from products import fastpath
+from products.models import Product
+from products.serializers import ProductSerializer
+from products.sparse import parse_fields
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares ProductSerializer + JSONRenderer with the values_list() fast path '
+        'on generated products (rolled back afterwards) and checks both give the same bytes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Products to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per path (best is kept)')
+        parser.add_argument('--fields', help='Optional sparse fieldset, e.g. id,name,price')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        self.create_products(options['count'])
+        fields = parse_fields(options['fields'])
+        queryset = Product.objects.order_by('-created_at', '-id')
+        columns, map_rows = fastpath.row_mapper(fields)
+        renderer = JSONRenderer()
+
+        def serializer_path():
+            return renderer.render(ProductSerializer(queryset, many=True, fields=fields).data)
+
+        def fast_path():
+            return fastpath.dumps(map_rows(list(queryset.values_list(*columns))))
+
+        expected, actual = serializer_path(), fast_path()
+        if expected != actual:
+            raise CommandError('Fast path output differs from ProductSerializer output')
+
+        slow = self.best_of(serializer_path, options['repeat'])
+        fast = self.best_of(fast_path, options['repeat'])
+        count = Product.objects.count()
+        self.stdout.write(f'{count} products, {len(actual)} bytes, identical output')
+        self.stdout.write(f'  ProductSerializer: {slow * 1000:8.1f} ms')
+        self.stdout.write(f'  fast path:         {fast * 1000:8.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Speedup: {slow / fast:.1f}x'))
+
+    def best_of(self, func, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def create_products(self, count):
+        rng = random.Random(42)
+        categories = [value for value, _ in Product.CATEGORY_CHOICES]
+        colors = [value for value, _ in Product.COLOR_CHOICES]
+        # Cover the values whose encoding is easiest to get wrong
+        names = ['Sedan', 'Café Crème', 'Line break', 'Quote "and" \\ slash', 'Tab\there', 'Sep\u2028arator', '車']
+        products = []
+        for i in range(count):
+            products.append(Product(
+                name=f'{rng.choice(names)} {i}',
+                brand=rng.choice(['Acme', 'Zoom', 'Ünïcode']),
+                color=rng.choice(colors),
+                description=rng.choice([None, '', 'Plain description', 'Multi\nline\r\n']),
+                price=Decimal(rng.randint(100, 9999999)) / 100,
+                category=rng.choice(categories),
+                image=rng.choice(['', f'products/ab/{i:064x}.jpg']),
+                image_thumbnail=rng.choice(['', f'products/derivatives/cd/{i:064x}.webp']),
+                rating=Decimal(rng.randint(0, 50)) / 10,
+                stock=rng.randint(0, 500),
+                review_count=rng.randint(0, 1000),
+            ))
+        Product.objects.bulk_create(products, batch_size=1000)
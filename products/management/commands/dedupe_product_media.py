@@ -0,0 +1,94 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from products.cache import bump_catalog_version
+from products.models import Product
+from products.storage import content_addressed_name, content_digest, is_content_addressed, product_storage
+
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_medium')
+MEDIA_DIR = 'products'
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves product media to content-addressed names (one file per distinct image) '
+        'and deletes files no product references any more'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without touching files or rows',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help='Only delete unreferenced files older than this many minutes (default 60)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = product_storage
+
+        referenced = set()
+        rows_updated = 0
+        for field in IMAGE_FIELDS:
+            names = (
+                Product.all_objects.exclude(Q(**{f'{field}__isnull': True}) | Q(**{field: ''}))
+                .values_list(field, flat=True)
+                .distinct()
+            )
+            for name in names:
+                if is_content_addressed(name):
+                    referenced.add(name)
+                    continue
+                if not storage.exists(name):
+                    self.stderr.write(f'Missing file referenced by products: {name}')
+                    continue
+
+                with storage.open(name, 'rb') as fh:
+                    content = File(fh, name)
+                    if dry_run:
+                        target = content_addressed_name(name, content_digest(content))
+                    else:
+                        target = storage.save(name, content)
+                referenced.add(target)
+                if not dry_run:
+                    rows_updated += Product.all_objects.filter(**{field: name}).update(**{field: target})
+                self.stdout.write(f'{name} -> {target}')
+
+        if rows_updated:
+            bump_catalog_version()
+
+        cutoff = timezone.now() - timedelta(minutes=options['min_age'])
+        removed = freed = 0
+        for name in self.walk(storage, MEDIA_DIR):
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                continue
+            freed += storage.size(name)
+            removed += 1
+            if not dry_run:
+                storage.delete(name)
+            self.stdout.write(f'Unreferenced: {name}')
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Updated {rows_updated} product references, '
+            f'removed {removed} unreferenced files ({freed / 1024 / 1024:.1f} MB)'
+        ))
+
+    def walk(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        dirs, files = storage.listdir(directory)
+        for filename in files:
+            yield posixpath.join(directory, filename)
+        for subdir in dirs:
+            yield from self.walk(storage, posixpath.join(directory, subdir))
@@ -0,0 +1,20 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.bulk import FORMATS, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Streams all active products as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file-format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (defaults to stdout)')
+
+    def handle(self, *args, **options):
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as fh:
+                fh.writelines(export_rows(options['file_format']))
+        else:
+            sys.stdout.writelines(export_rows(options['file_format']))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from products.images import generate_derivatives
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generates thumbnail and medium WebP variants for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate variants for every product, not only those missing them',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.all_objects.exclude(Q(image__isnull=True) | Q(image=''))
+        if not options['all']:
+            products = products.filter(
+                Q(image_thumbnail__isnull=True) | Q(image_thumbnail='')
+                | Q(image_medium__isnull=True) | Q(image_medium='')
+            )
+
+        done = failed = 0
+        for product_id in products.values_list('id', flat=True).iterator():
+            try:
+                generate_derivatives(product_id)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Product #{product_id}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} products ({failed} failed)'))
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk import DEFAULT_BATCH_SIZE, FORMATS, ProductImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk creates/updates products from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument('--file-format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or guess_format(path)
+        try:
+            with open(path, 'rb') as fh:
+                report = ProductImporter(batch_size=options['batch_size']).run(read_rows(fh, file_format))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, "
+            f"{report['error_count']} rows rejected"
+        ))
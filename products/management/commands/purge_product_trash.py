@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from products.tasks import PURGE_BATCH_SIZE, PURGE_PAUSE_SECONDS, purge_trashed_products
+
+
+class Command(BaseCommand):
+    help = 'Permanently deletes products that have been in the trash longer than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Retention period in days (defaults to PRODUCT_TRASH_RETENTION_DAYS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=PURGE_PAUSE_SECONDS,
+            help='Seconds to sleep between batches',
+        )
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        result = purge_trashed_products(
+            retention_days=options['days'],
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            max_batches=options['max_batches'],
+        )
+        for label, count in sorted(result['related_deleted'].items()):
+            self.stdout.write(f'  {label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {result['purged']} products trashed before "
+            f"{result['cutoff']:%Y-%m-%d %H:%M} in {result['batches']} batches"
+        ))
+        if result['kept_ordered']:
+            self.stdout.write(f"Kept {result['kept_ordered']} trashed products that appear in orders")
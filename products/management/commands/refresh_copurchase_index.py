@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.copurchase import DEFAULT_TOP_K, MAX_BASKET_SIZE, MIN_SHARED_ORDERS, refresh_copurchase_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the "frequently bought together" index from order items (run it periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Related products kept per product')
+        parser.add_argument(
+            '--min-count',
+            type=int,
+            default=MIN_SHARED_ORDERS,
+            help='Minimum number of shared orders for a pair to count',
+        )
+        parser.add_argument(
+            '--max-basket-size',
+            type=int,
+            default=MAX_BASKET_SIZE,
+            help='Ignore orders with more distinct products than this',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        result = refresh_copurchase_index(
+            k=options['top_k'],
+            min_count=options['min_count'],
+            max_basket_size=options['max_basket_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {result['products']} products from {result['order_items']} order items "
+            f"in {time.perf_counter() - start:.2f}s"
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:44
+
+import products.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=products.storage.get_product_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image_medium',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=products.storage.get_product_storage, upload_to='products/derivatives/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=products.storage.get_product_storage, upload_to='products/derivatives/'),
+        ),
+    ]
@@ -1,6 +1,21 @@
 # products/models.py
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+from .storage import get_product_storage
+
+class LiveProductManager(models.Manager):
+    """Products that are not in the trash"""
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class TrashedProductManager(models.Manager):
+    """Products that are in the trash"""
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=True)
+
+
 class Product(models.Model):
     CATEGORY_CHOICES = [
         ('Hatchback', 'Hatchback'),
@@ -25,9 +40,19 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='Hatchback')
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Stored under a hash of the file content, see products.storage
+    image = models.ImageField(upload_to='products/', storage=get_product_storage, blank=True, null=True)
+    # Resized WebP variants of `image`, generated in the background (see products.images)
+    image_thumbnail = models.ImageField(
+        upload_to='products/derivatives/', storage=get_product_storage, blank=True, null=True, editable=False
+    )
+    image_medium = models.ImageField(
+        upload_to='products/derivatives/', storage=get_product_storage, blank=True, null=True, editable=False
+    )
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0.0)
     stock = models.PositiveIntegerField(default=0)
+    # Units held by unexpired cart reservations, maintained by cart.reservations
+    reserved_stock = models.PositiveIntegerField(default=0, editable=False)
     
     # Soft delete fields
     is_deleted = models.BooleanField(default=False)
@@ -37,12 +62,65 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     review_count = models.PositiveIntegerField(default=0)
 
+    # Maintained by a database trigger on PostgreSQL (see migration 0006)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # `objects` (the default manager) never returns trashed products
+    objects = LiveProductManager()
+    all_objects = models.Manager()
+    trashed = TrashedProductManager()
+
     class Meta:
         ordering = ['-created_at']
+        # Related objects (cart.product, order items...) still resolve trashed products
+        base_manager_name = 'all_objects'
+        # Partial indexes: live-catalog queries only ever touch live rows
+        indexes = [
+            # Keyset pagination of the live catalog
+            models.Index(
+                fields=['-created_at', '-id'], name='product_live_created_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            # Faceted filtering of the live catalog
+            models.Index(fields=['category'], name='product_live_category_idx', condition=models.Q(is_deleted=False)),
+            models.Index(fields=['color'], name='product_live_color_idx', condition=models.Q(is_deleted=False)),
+            models.Index(fields=['brand'], name='product_live_brand_idx', condition=models.Q(is_deleted=False)),
+            models.Index(fields=['price'], name='product_live_price_idx', condition=models.Q(is_deleted=False)),
+            # Low-stock alert scan
+            models.Index(fields=['stock'], name='product_live_stock_idx', condition=models.Q(is_deleted=False)),
+            # Trash listing and retention purge
+            models.Index(fields=['-deleted_at'], name='product_trash_deleted_idx', condition=models.Q(is_deleted=True)),
+            # max(updated_at) validator for conditional GETs
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.brand} {self.name}"
 
+    def save(self, *args, **kwargs):
+        # reserved_stock only changes through guarded UPDATEs (cart.reservations, orders.views.take_stock);
+        # a full save of a stale instance must not write it back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skip = self.get_deferred_fields() | {'reserved_stock'}
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in skip
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def available_stock(self):
+        """Units that can still be added to a cart or ordered"""
+        return max(self.stock - self.reserved_stock, 0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored image so a changed upload can be detected on save
+        if 'image' in field_names:
+            instance._loaded_image = values[field_names.index('image')]
+        return instance
+
     def soft_delete(self):
         """Move product to trash"""
         from django.utils import timezone
@@ -54,4 +132,19 @@ class Product(models.Model):
         """Restore product from trash"""
         self.is_deleted = False
         self.deleted_at = None
-        self.save()
\ No newline at end of file
+        self.save()
+
+class ProductCoPurchase(models.Model):
+    """
+    "Frequently bought together" for one product: the ids of the products
+    most often ordered with it, best first. Rebuilt in bulk from order
+    items by products.copurchase.refresh_copurchase_index().
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name='co_purchase'
+    )
+    related_ids = models.JSONField(default=list)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Bought with {self.product_id}: {self.related_ids}"
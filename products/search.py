@@ -0,0 +1,36 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+SEARCH_CONFIG = 'english'
+
+
+def search_products(queryset, query):
+    """
+    Rank products matching `query` on name, brand and description.
+
+    On PostgreSQL this uses the trigger-maintained `search_vector` column
+    and its GIN index (name weighted above brand above description).
+    Other backends, i.e. SQLite for local runs, fall back to substring
+    matching with the same field precedence.
+    """
+    if connection.vendor == 'postgresql':
+        ts_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            queryset.filter(search_vector=ts_query)
+            .annotate(rank=SearchRank(F('search_vector'), ts_query))
+            .order_by('-rank', '-id')
+        )
+
+    return (
+        queryset.filter(
+            Q(name__icontains=query) | Q(brand__icontains=query) | Q(description__icontains=query)
+        )
+        .annotate(rank=Case(
+            When(name__icontains=query, then=Value(3)),
+            When(brand__icontains=query, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ))
+        .order_by('-rank', '-id')
+    )
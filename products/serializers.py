@@ -1,29 +1,75 @@
 # products/serializers.py
 from rest_framework import serializers
 from .models import Product
+from .sparse import SparseFieldsMixin
 
-class ProductSerializer(serializers.ModelSerializer):
-    review_count = serializers.SerializerMethodField()
-    average_rating = serializers.SerializerMethodField()
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Denormalized on Product and maintained by reviews.signals
+    review_count = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(source='rating', read_only=True)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'brand', 'color', 'description', 'price',
-            'category', 'image', 'rating', 'stock', 'created_at',
+            'category', 'image', 'image_variants', 'rating', 'stock', 'created_at',
             'updated_at', 'review_count', 'average_rating', 'is_deleted', 'deleted_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'is_deleted', 'deleted_at']
-
-    def get_review_count(self, obj):
-        return obj.reviews.count() if hasattr(obj, 'reviews') else 0
-
-    def get_average_rating(self, obj):
-        reviews = getattr(obj, 'reviews', None)
-        if not reviews:
-            return 0
-        reviews_qs = reviews.all() if callable(getattr(reviews, 'all', None)) else reviews
-        count = reviews_qs.count()
-        if count == 0:
-            return 0
-        return sum([r.rating for r in reviews_qs]) / count
+        read_only_fields = [
+            'id', 'rating', 'created_at', 'updated_at', 'is_deleted', 'deleted_at'
+        ]
+        field_sources = {
+            'image_variants': ['image', 'image_thumbnail', 'image_medium'],
+        }
+
+    def get_image_variants(self, obj):
+        """Thumbnail/medium WebP URLs, falling back to the original until they are generated"""
+        original = self._file_url(obj.image)
+        return {
+            'thumbnail': self._file_url(obj.image_thumbnail) or original,
+            'medium': self._file_url(obj.image_medium) or original,
+        }
+
+    def _file_url(self, file):
+        if not file:
+            return None
+        url = file.url
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class AvailableStockProductSerializer(ProductSerializer):
+    """
+    ProductSerializer plus available_stock (stock minus cart holds). Holds
+    change too often to cache, so this is only for uncached endpoints.
+    """
+    available_stock = serializers.IntegerField(read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['available_stock']
+        field_sources = {
+            **ProductSerializer.Meta.field_sources,
+            'available_stock': ['stock', 'reserved_stock'],
+        }
+
+
+class BulkAdjustSerializer(serializers.Serializer):
+    """Target products by id list and/or category/brand, then shift stock and/or price"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    category = serializers.ChoiceField(choices=Product.CATEGORY_CHOICES, required=False)
+    brand = serializers.CharField(required=False)
+    stock_delta = serializers.IntegerField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    price_percent = serializers.DecimalField(
+        max_digits=6, decimal_places=2, min_value=-99, max_value=1000, required=False
+    )
+
+    def validate(self, attrs):
+        if not any(key in attrs for key in ('ids', 'category', 'brand')):
+            raise serializers.ValidationError("Provide 'ids', 'category' or 'brand' to select products.")
+        if not any(key in attrs for key in ('stock_delta', 'price', 'price_percent')):
+            raise serializers.ValidationError("Provide 'stock_delta', 'price' or 'price_percent'.")
+        if 'price' in attrs and 'price_percent' in attrs:
+            raise serializers.ValidationError("Use either 'price' or 'price_percent', not both.")
+        return attrs
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import autocomplete_index
+from .cache import bump_catalog_version, bump_names_version
+from .images import schedule_derivatives
+from .models import Product
+
+
+# Fields the autocomplete index is built from (is_deleted: trash/restore)
+NAME_FIELDS = {'name', 'brand', 'is_deleted'}
+
+
+# Versions are bumped once the change has committed: a GET racing the
+# transaction would otherwise cache pre-commit rows under the new version.
+# save() covers create, update, soft_delete() and restore()
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, update_fields=None, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+    if created or update_fields is None or NAME_FIELDS & set(update_fields):
+        transaction.on_commit(lambda: autocomplete_index.update_product(instance, bump_names_version()))
+
+    # Render thumbnails whenever a new image is uploaded (or the image is cleared)
+    if 'image' in instance.get_deferred_fields():
+        return
+    image = instance.image.name if instance.image else None
+    if image != (getattr(instance, '_loaded_image', None) or None):
+        instance._loaded_image = image
+        schedule_derivatives(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(bump_catalog_version)
+    transaction.on_commit(lambda: autocomplete_index.remove_product(pk, bump_names_version()))
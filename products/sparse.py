@@ -0,0 +1,109 @@
+"""
+Sparse fieldsets: ``?fields=id,name,price`` trims a response to the listed
+fields, and dotted names reach into nested serializers
+(``?fields=id,quantity,product.name``).
+
+The same spec also trims the query: sparse_queryset() loads only the
+model columns the trimmed serializer still reads.
+"""
+from rest_framework import serializers
+
+
+def parse_fields(raw):
+    """'id,product.name,product.price' -> {'id': {}, 'product': {'name': {}, 'price': {}}}"""
+    if not raw:
+        return None
+    tree = {}
+    for path in raw.split(','):
+        parts = [p.strip() for p in path.split('.') if p.strip()]
+        node = tree
+        for part in parts:
+            node = node.setdefault(part, {})
+    return tree or None
+
+
+def fields_from_request(request):
+    return parse_fields(request.query_params.get('fields'))
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin accepting a `fields` tree (see parse_fields). Fields
+    not in the tree are dropped; a nested serializer listed with its own
+    sub-fields is trimmed recursively, one listed bare is kept whole.
+
+    Serializer method fields and methods exposed as fields declare the
+    model columns they read in ``Meta.field_sources``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            self.apply_sparse_fields(fields)
+
+    def apply_sparse_fields(self, tree):
+        for name in list(self.fields):
+            if name not in tree:
+                self.fields.pop(name)
+            elif tree[name]:
+                field = self.fields[name]
+                nested = getattr(field, 'child', field)
+                if isinstance(nested, SparseFieldsMixin):
+                    nested.apply_sparse_fields(tree[name])
+
+
+def only_fields(serializer, prefix=''):
+    """
+    Model field paths read by `serializer` (after trimming), including
+    forward relations rendered by nested serializers. To-many nested
+    serializers are skipped; load those with a Prefetch of their own.
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    model = serializer.Meta.model
+    sources = getattr(serializer.Meta, 'field_sources', {})
+    concrete = {f.name for f in model._meta.concrete_fields}
+    paths = [prefix + model._meta.pk.name]
+
+    for name, field in serializer.fields.items():
+        if isinstance(field, serializers.ListSerializer):
+            continue
+        if name in sources:
+            paths.extend(prefix + source for source in sources[name])
+            continue
+        source = field.source.split('.')[0]
+        if source not in concrete:
+            continue
+        paths.append(prefix + source)
+        if isinstance(field, serializers.BaseSerializer):
+            paths.extend(only_fields(field, prefix=f'{prefix}{source}__'))
+    return list(dict.fromkeys(paths))
+
+
+def sparse_queryset(queryset, serializer_class, fields, *extra):
+    """
+    queryset.only() the columns `serializer_class` needs for `fields`, plus
+    any `extra` columns the caller reads itself (ordering, cursors, FKs
+    used by a prefetch). Returns the queryset unchanged without a spec.
+    """
+    if not fields:
+        return queryset
+    paths = [*only_fields(serializer_class(fields=fields)), *extra]
+    # Django refuses to defer a relation that is also select_related()
+    if isinstance(queryset.query.select_related, dict):
+        related = _related_paths(queryset.query.select_related)
+        kept = [path for path in related if path in paths]
+        if kept != related:
+            queryset = queryset.select_related(None)
+            if kept:
+                queryset = queryset.select_related(*kept)
+    return queryset.only(*paths)
+
+
+def _related_paths(tree, prefix=''):
+    """{'product': {'brand': {}}} (QuerySet.query.select_related) -> ['product', 'product__brand']"""
+    paths = []
+    for name, children in tree.items():
+        paths.append(prefix + name)
+        paths.extend(_related_paths(children, f'{prefix}{name}__'))
+    return paths
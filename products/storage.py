@@ -0,0 +1,66 @@
+"""
+Content-addressed storage for product media.
+
+Files are stored under the SHA-256 of their bytes, e.g.
+``products/3f/3fa8...e1.jpg``. Uploading an image that already exists
+writes nothing and reuses the stored file, so several products can
+share one file. Because a name always maps to the same bytes, the URLs
+are immutable and can be cached forever.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}\.[A-Za-z0-9]+$')
+
+# Cache-Control sent with content-addressed files
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def content_digest(content):
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+def content_addressed_name(name, digest):
+    directory = posixpath.dirname(name)
+    ext = posixpath.splitext(name)[1].lower()
+    return posixpath.join(directory, digest[:2], f'{digest}{ext}')
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_ADDRESSED_NAME.search(name or ''))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        target = content_addressed_name(name, content_digest(content))
+        if self.exists(target):
+            return target
+
+        saved = super().save(target, content, max_length=max_length)
+        if saved != target:
+            # Lost a race with an identical upload: keep the first copy
+            self.delete(saved)
+        return target
+
+
+def get_product_storage():
+    return product_storage
+
+
+product_storage = ContentAddressedStorage()
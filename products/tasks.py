@@ -0,0 +1,68 @@
+"""
+Maintenance jobs for the product catalog.
+
+Plain functions so they can be run from cron through their management
+commands, or handed to any task scheduler as-is.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from orders.models import OrderItem
+
+from .models import Product
+
+PURGE_BATCH_SIZE = 100
+PURGE_PAUSE_SECONDS = 0.5
+
+
+def purge_trashed_products(retention_days=None, batch_size=PURGE_BATCH_SIZE,
+                           pause=PURGE_PAUSE_SECONDS, max_batches=None):
+    """
+    Permanently delete products that have been in the trash for longer
+    than `retention_days`. Products that were ever ordered are kept (in
+    the trash), since deleting them would cascade into order history.
+
+    Each batch is its own short transaction, so the cascade into carts,
+    wishlists and reviews only ever locks a few rows, and the job sleeps
+    `pause` seconds between batches to leave room for regular traffic.
+    """
+    if retention_days is None:
+        retention_days = settings.PRODUCT_TRASH_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    trashed = Product.trashed.filter(deleted_at__lt=cutoff)
+    ordered = Exists(OrderItem.objects.filter(product=OuterRef('pk')))
+    expired = trashed.exclude(ordered)
+
+    purged = batches = 0
+    related = {}
+    while max_batches is None or batches < max_batches:
+        ids = list(expired.order_by('deleted_at', 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+
+        with transaction.atomic():
+            _, per_model = expired.filter(pk__in=ids).delete()
+        batches += 1
+        for label, count in per_model.items():
+            if label == Product._meta.label:
+                purged += count
+            else:
+                related[label] = related.get(label, 0) + count
+
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    return {
+        'purged': purged,
+        'batches': batches,
+        'related_deleted': related,
+        'kept_ordered': trashed.filter(ordered).count(),
+        'cutoff': cutoff,
+    }
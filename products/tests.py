@@ -1,3 +1,621 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from orders.models import Order, OrderItem
+from reviews.models import Review
+from wishlist.models import Wishlist
+from . import fastpath
+from .autocomplete import AutocompleteIndex
+from .cache import bump_names_version, get_catalog_version, get_names_version
+from .copurchase import co_occurrence, refresh_copurchase_index, top_k
+from .images import generate_derivatives
+from .models import Product, ProductCoPurchase
+from .storage import is_content_addressed
+from .tasks import purge_trashed_products
+
+User = get_user_model()
+
+
+class CatalogTestCase(TestCase):
+    """
+    Starts from an empty catalog cache. Version bumps run on commit, which
+    never happens inside a TestCase, so entries would leak between tests.
+    """
+    def setUp(self):
+        cache.clear()
+
+
+class AdminTestCase(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pw', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+
+class PaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [Product.objects.create(name=f'P{i}', price='10.00', stock=1) for i in range(5)]
+        # Ties on created_at are broken by id
+        Product.objects.filter(pk__in=[p.pk for p in self.products[1:4]]).update(
+            created_at=self.products[1].created_at
+        )
+        self.client = APIClient()
+
+    def walk(self, **headers):
+        names, url = [], '/api/products/products/?page_size=2'
+        while url:
+            data = self.client.get(url, **headers).json()
+            self.assertLessEqual(len(data['results']), 2)
+            names += [p['name'] for p in data['results']]
+            url = data['next']
+        return names
+
+    def test_cursor_walks_every_product_once_newest_first(self):
+        expected = [p.name for p in sorted(
+            Product.objects.all(), key=lambda p: (p.created_at, p.pk), reverse=True
+        )]
+        self.assertEqual(self.walk(), expected)
+        # The serializer path pages the same way as the fast path
+        self.assertEqual(self.walk(HTTP_ACCEPT='application/json; indent=2'), expected)
+
+    def test_cursor_bounds_the_index_scan(self):
+        next_url = self.client.get('/api/products/products/?page_size=2').json()['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(next_url)
+        page_query = next(q['sql'] for q in queries if 'ORDER BY' in q['sql'])
+        self.assertIn('"products_product"."created_at" <=', page_query)
+
+    def test_page_size_is_capped_and_bad_cursors_rejected(self):
+        Product.objects.bulk_create(Product(name=f'Q{i}', price='1.00', stock=1) for i in range(120))
+        self.assertEqual(len(self.client.get('/api/products/products/?page_size=500').json()['results']), 100)
+        self.assertEqual(self.client.get('/api/products/products/?cursor=garbage').status_code, 404)
+
+
+class CatalogCacheTests(AdminTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.url = f'/api/products/products/{self.product.pk}/'
+
+    def test_detail_is_served_from_cache_until_a_change(self):
+        self.assertEqual(self.client.get(self.url).data['name'], 'Wheel')
+        # Only the validator lookup; the payload comes from the cache
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).data['name'], 'Wheel')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url, {'name': 'Big wheel'})
+        self.assertEqual(self.client.get(self.url).data['name'], 'Big wheel')
+
+    def test_version_is_bumped_after_commit(self):
+        self.client.get(self.url)
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.product.name = 'Big wheel'
+                self.product.save()
+                # Other connections still read the old row, so the old version must stay current
+                self.assertEqual(get_catalog_version(), version)
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(self.client.get(self.url).data['name'], 'Big wheel')
+
+    def test_list_is_invalidated_by_new_products(self):
+        self.assertEqual(len(self.client.get('/api/products/products/').json()['results']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Horn', price='5.00', stock=1)
+        self.assertEqual(len(self.client.get('/api/products/products/').json()['results']), 2)
+
+    def test_stats(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        stats = self.client.get('/api/products/products/cache-stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.client = APIClient()
+
+    def test_list_etag_changes_with_products_and_params(self):
+        url = '/api/products/products/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, {'brand': 'Acme'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.soft_delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_detail_last_modified(self):
+        url = f'/api/products/products/{self.product.pk}/'
+        response = self.client.get(url)
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        Product.objects.filter(pk=self.product.pk).update(updated_at=self.product.updated_at + timedelta(seconds=5))
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+        self.assertEqual(self.client.get('/api/products/products/0/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+
+class ProductImportTests(AdminTestCase):
+    def upload(self, content, name='products.csv'):
+        return self.client.post(
+            '/api/products/products/import/', {'file': SimpleUploadedFile(name, content.encode())}, format='multipart'
+        )
+
+    def test_creates_and_updates(self):
+        product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        response = self.upload(f'id,name,price,stock\n{product.id},Wheel,89.00,7\n,Horn,5.00,3\n,,1.00,1\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(len(response.data['errors']), 1)
+        product.refresh_from_db()
+        self.assertEqual((str(product.price), product.stock), ('89.00', 7))
+        self.assertTrue(Product.objects.filter(name='Horn', stock=3).exists())
+
+    def test_ndjson_import_reports_bad_rows(self):
+        response = self.upload(
+            '{"name": "Wheel", "price": "99.00", "stock": 2}\nnot json\n{"name": "Horn", "price": "-"}\n',
+            name='products.ndjson',
+        )
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 0))
+        self.assertEqual(len(response.data['errors']), 2)
+        self.assertEqual(Product.objects.get().name, 'Wheel')
+
+    def test_ndjson_numeric_price(self):
+        response = self.upload('{"name": "Wheel", "price": 19.99, "stock": 2}\n', name='products.ndjson')
+        self.assertEqual((response.data['created'], response.data['error_count']), (1, 0))
+        self.assertEqual(Product.objects.get().price, Decimal('19.99'))
+
+    def test_raw_body_upload(self):
+        response = self.client.generic(
+            'POST', '/api/products/products/import/',
+            '{"name": "Wheel", "price": "99.00", "stock": 2}\n', content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Product.objects.get().name, 'Wheel')
+
+    def test_updates_trashed_product(self):
+        product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        product.soft_delete()
+        response = self.upload(f'id,stock\n{product.id},9\n')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(Product.all_objects.get(pk=product.pk).stock, 9)
+
+
+class ProductExportTests(AdminTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wheel = Product.objects.create(name='Wheel', brand='Acme', price='99.00', stock=5)
+        Product.objects.create(name='Horn', price='5.00', stock=1).soft_delete()
+
+    def export(self, file_format):
+        response = self.client.get('/api/products/products/export/', {'file_format': file_format})
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_and_ndjson_skip_trash(self):
+        response, body = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(body.splitlines(), [
+            'id,name,brand,color,description,price,category,stock',
+            f'{self.wheel.id},Wheel,Acme,Black,,99.00,Hatchback,5',
+        ])
+        _, body = self.export('ndjson')
+        record = json.loads(body)
+        self.assertEqual((record['id'], record['price'], record['stock']), (self.wheel.id, '99.00', 5))
+
+    def test_export_reimports_unchanged(self):
+        _, body = self.export('csv')
+        response = self.client.post(
+            '/api/products/products/import/', {'file': SimpleUploadedFile('p.csv', body.encode())}, format='multipart'
+        )
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 1))
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_rejects_unknown_format(self):
+        self.assertEqual(self.client.get('/api/products/products/export/', {'file_format': 'xml'}).status_code, 400)
+
+
+class BulkAdjustTests(AdminTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sedan = Product.objects.create(name='Sedan', category='Sedan', price='100.00', stock=5)
+        self.suv = Product.objects.create(name='SUV', category='SUV', price='200.00', stock=1)
+        self.trashed = Product.objects.create(name='Old', category='SUV', price='50.00', stock=0)
+        self.trashed.soft_delete()
+
+    def adjust(self, **data):
+        return self.client.post('/api/products/products/bulk-adjust/', data, format='json')
+
+    def values(self):
+        return dict(Product.all_objects.values_list('name', 'stock'))
+
+    def test_stock_delta_skips_products_without_enough_stock(self):
+        response = self.adjust(ids=[self.sedan.id, self.suv.id], stock_delta=-2)
+        self.assertEqual(response.data, {'matched': 2, 'updated': 1, 'skipped': 1})
+        self.assertEqual(self.values(), {'Sedan': 3, 'SUV': 1, 'Old': 0})
+
+    def test_price_percent_by_category_leaves_trash_alone(self):
+        self.adjust(category='SUV', price_percent='10')
+        self.assertEqual(
+            dict(Product.all_objects.values_list('name', 'price')),
+            {'Sedan': Decimal('100.00'), 'SUV': Decimal('220.00'), 'Old': Decimal('50.00')},
+        )
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.adjust(stock_delta=1).status_code, 400)
+        self.assertEqual(self.adjust(ids=[self.sedan.id]).status_code, 400)
+        self.assertEqual(self.adjust(ids=[self.sedan.id], price='1.00', price_percent='5').status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertIn(self.adjust(ids=[self.sedan.id], stock_delta=1).status_code, (401, 403))
+
+    def test_price_percent_that_would_overflow_is_rejected(self):
+        Product.objects.filter(pk=self.suv.pk).update(price='99999999.00')
+        self.assertEqual(self.adjust(ids=[self.sedan.id], price_percent='1001').status_code, 400)
+        response = self.adjust(category='SUV', price_percent='10')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.get(pk=self.suv.pk).price, Decimal('99999999.00'))
+        self.assertEqual(self.adjust(category='SUV', price_percent='-10').status_code, 200)
+
+
+class SoftDeleteTests(AdminTestCase):
+    def test_trashed_products_leave_the_catalog_until_restored(self):
+        product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        product.soft_delete()
+        self.assertFalse(Product.objects.filter(pk=product.pk).exists())
+        self.assertEqual(Product.trashed.get().pk, product.pk)
+        self.assertEqual(self.client.get(f'/api/products/products/{product.pk}/').status_code, 404)
+
+        self.assertEqual(self.client.post(f'/api/products/products/{product.pk}/restore/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/products/products/{product.pk}/').status_code, 200)
+
+
+class FilterTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(name='Wheel', brand='Acme', color='black', category='parts', price='900.00', stock=5)
+        Product.objects.create(name='Rim', brand='Acme', color='silver', category='parts', price='3000.00', stock=0)
+        Product.objects.create(name='Horn', brand='Beep', color='black', category='extras', price='500.00', stock=2)
+        self.client = APIClient()
+
+    def get(self, **params):
+        return self.client.get('/api/products/products/', params, HTTP_ACCEPT='application/json; indent=2')
+
+    def test_filters(self):
+        names = lambda **params: sorted(p['name'] for p in self.get(**params).data['results'])
+        self.assertEqual(names(brand='Acme'), ['Rim', 'Wheel'])
+        self.assertEqual(names(color='black,silver', in_stock='true'), ['Horn', 'Wheel'])
+        self.assertEqual(names(min_price='800', max_price='3000'), ['Rim', 'Wheel'])
+
+    def test_rejects_non_finite_prices(self):
+        for value in ['NaN', 'sNaN', 'Infinity', '-inf', 'cheap']:
+            response = self.get(min_price=value)
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('min_price', response.data)
+
+    def test_each_facet_ignores_its_own_filter(self):
+        facets = self.get(brand='Acme', color='black', facets='true').data['facets']
+        # Brands counted with only the color filter, colors with only the brand filter
+        self.assertEqual(facets['brand'], {'Acme': 1, 'Beep': 1})
+        self.assertEqual(facets['color'], {'black': 1, 'silver': 1})
+        self.assertEqual(facets['category'], {'parts': 1})
+        self.assertEqual(facets['price']['0-1000'], 1)
+
+        facets = self.get(max_price='1000', facets='true').data['facets']
+        self.assertEqual(facets['price']['1000-5000'], 1)
+        self.assertEqual(facets['brand'], {'Acme': 1, 'Beep': 1})
+
+
+def png(color='red', size=(1200, 900)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class MediaTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class ContentAddressedMediaTests(MediaTestCase):
+    def test_identical_uploads_share_one_file(self):
+        first = Product.objects.create(name='Wheel', price='1.00', stock=1, image=SimpleUploadedFile('a.png', png()))
+        second = Product.objects.create(name='Rim', price='1.00', stock=1, image=SimpleUploadedFile('b.png', png()))
+        other = Product.objects.create(
+            name='Horn', price='1.00', stock=1, image=SimpleUploadedFile('a.png', png('blue'))
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(is_content_addressed(first.image.name))
+        stored = [name for _, _, names in os.walk(self.media_root) for name in names]
+        self.assertEqual(len(stored), 2)
+
+
+class ImageDerivativeTests(MediaTestCase):
+    def test_derivatives_touch_updated_at_and_bump_catalog(self):
+        product = Product.objects.create(
+            name='Wheel', price='99.00', stock=5, image=SimpleUploadedFile('wheel.png', png())
+        )
+        before, version = product.updated_at, get_catalog_version()
+
+        generate_derivatives(product.pk)
+        product.refresh_from_db()
+        self.assertTrue(product.image_thumbnail.name.endswith('.webp'))
+        self.assertGreater(product.updated_at, before)
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class SearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(name='Bell', brand='Wheelie', price='5.00', stock=1)
+        Product.objects.create(name='Pump', description='Fits any wheel', price='15.00', stock=1)
+        Product.objects.create(name='Wheel', price='99.00', stock=1)
+        Product.objects.create(name='Horn', price='5.00', stock=1).soft_delete()
+        self.client = APIClient()
+
+    def search(self, **params):
+        return self.client.get('/api/products/products/search/', params)
+
+    def test_ranks_name_over_brand_over_description(self):
+        response = self.search(q='wheel')
+        self.assertEqual([p['name'] for p in response.data['results']], ['Wheel', 'Bell', 'Pump'])
+        self.assertEqual(self.search(q='wheel', page_size=2, page=2).data['results'][0]['name'], 'Pump')
+
+    def test_skips_trash_and_requires_a_query(self):
+        self.assertEqual(self.search(q='horn').data['results'], [])
+        self.assertEqual(self.search(q=' ').status_code, 400)
+
+    def test_oversized_page_is_not_found(self):
+        self.assertEqual(self.search(q='wheel', page=1000).status_code, 200)
+        self.assertEqual(self.search(q='wheel', page='99999999999999999999').status_code, 404)
+
+
+class ProductSparseFieldsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name='Wheel', description='Round', price='99.00', stock=5)
+        self.client = APIClient()
+
+    def test_detail_loads_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/products/products/{self.product.pk}/', {'fields': 'id,name'})
+        self.assertEqual(response.data, {'id': self.product.pk, 'name': 'Wheel'})
+        product_query = next(q['sql'] for q in queries if '"name"' in q['sql'])
+        self.assertNotIn('"description"', product_query)
+
+    def test_list_on_both_paths(self):
+        for accept in ('application/json', 'application/json; indent=2'):
+            response = self.client.get('/api/products/products/', {'fields': 'name,image_variants'}, HTTP_ACCEPT=accept)
+            self.assertEqual(
+                response.json()['results'],
+                [{'name': 'Wheel', 'image_variants': {'thumbnail': None, 'medium': None}}],
+            )
+
+
+class CoPurchaseTests(CatalogTestCase):
+    def test_matrix_matches_brute_force(self):
+        baskets = {1: [10, 11, 12], 2: [10, 11], 3: [11, 12, 12], 4: [13], 5: [10, 11, 12, 13]}
+        pairs = np.array([(order, product) for order, items in baskets.items() for product in items])
+        expected = {}
+        for items in baskets.values():
+            items = set(items)
+            if 1 < len(items) <= 3:
+                for a in items:
+                    for b in items - {a}:
+                        expected[a, b] = expected.get((a, b), 0) + 1
+        a, b, counts = co_occurrence(pairs, max_basket_size=3)
+        self.assertEqual(dict(zip(zip(a.tolist(), b.tolist()), counts.tolist())), expected)
+        self.assertEqual(top_k(a, b, counts, k=1)[10], [11])
+        self.assertEqual(top_k(a, b, counts, k=2, min_count=2), {10: [11], 11: [10, 12], 12: [11]})
+
+    def test_refresh_and_endpoint(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        wheel, rim, horn, bell = (
+            Product.objects.create(name=name, price='1.00', stock=1) for name in ('Wheel', 'Rim', 'Horn', 'Bell')
+        )
+        for basket in ([wheel, rim], [wheel, rim, horn], [wheel, bell]):
+            order = Order.objects.create(user=user, total='1.00', address='Somewhere')
+            OrderItem.objects.bulk_create(OrderItem(order=order, product=p, price='1.00') for p in basket)
+        bell.soft_delete()
+
+        self.assertEqual(refresh_copurchase_index(), {'order_items': 6, 'products': 3})
+        response = APIClient().get(f'/api/products/products/{wheel.pk}/bought-together/', {'fields': 'name'})
+        self.assertEqual(response.data['results'], [{'name': 'Rim'}, {'name': 'Horn'}])
+
+
+class IncludeTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.wheel = Product.objects.create(name='Wheel', category='Sedan', price='99.00', stock=5)
+        self.rim = Product.objects.create(name='Rim', category='Sedan', price='50.00', stock=5, rating='4.5')
+        self.horn = Product.objects.create(name='Horn', category='SUV', price='5.00', stock=5)
+        self.client = APIClient()
+
+    def get(self, include, **params):
+        return self.client.get(f'/api/products/products/{self.wheel.pk}/', {'include': include, **params})
+
+    def test_reviews_newest_first(self):
+        for rating in (2, 5):
+            user = User.objects.create_user(username=f'u{rating}', email=f'u{rating}@example.com', password='pw')
+            Review.objects.create(product=self.wheel, user=user, rating=rating)
+        reviews = self.get('reviews').data['reviews']
+        self.assertEqual([r['rating'] for r in reviews], [5, 2])
+
+    def test_related_puts_bought_together_before_same_category(self):
+        ProductCoPurchase.objects.create(product=self.wheel, related_ids=[self.horn.pk])
+        related = self.get('related', fields='id,name').data['related']
+        self.assertEqual(related, [{'id': self.horn.pk, 'name': 'Horn'}, {'id': self.rim.pk, 'name': 'Rim'}])
+
+    def test_wishlist_status_is_per_user(self):
+        Wishlist.objects.create(user=self.user, product=self.wheel)
+        self.assertFalse(self.get('wishlist_status').data['in_wishlist'])
+        self.client.force_authenticate(self.user)
+        response = self.get('wishlist_status')
+        self.assertTrue(response.data['in_wishlist'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_unknown_include(self):
+        self.assertEqual(self.get('everything').status_code, 400)
+
+
+class FastPathTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Product.objects.create(name='Wheel', price='99.00', stock=5, rating='4.5', review_count=2)
+        Product.objects.create(
+            name='Rückspiegel "pro"', brand='Acme', description='Line\nbreak', price='1234.50', stock=0,
+            image='products/ab/wheel.png', image_thumbnail='products/derivatives/ab/thumb.webp',
+        )
+        self.client = APIClient()
+
+    def test_same_bytes_as_the_serializer(self):
+        self.assertTrue(fastpath.supported())
+        for fields in ('', 'id,name,price,image_variants,created_at'):
+            fast = self.client.get('/api/products/products/', {'fields': fields})
+            slow = self.client.get(
+                '/api/products/products/', {'fields': fields}, HTTP_ACCEPT='application/json; indent=2'
+            )
+            self.assertNotIsInstance(fast, Response)
+            self.assertEqual(fast.content, JSONRenderer().render(slow.data), fields)
+
+
+class AvailableStockTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.client = APIClient()
+
+    def test_catalog_responses_leave_out_available_stock(self):
+        # Holds do not touch updated_at, so cached and 304 responses must not carry it
+        detail = self.client.get(f'/api/products/products/{self.product.pk}/')
+        self.assertEqual(detail.status_code, 200)
+        self.assertIn('stock', detail.data)
+        self.assertNotIn('available_stock', detail.data)
+        listing = self.client.get('/api/products/products/').json()
+        self.assertNotIn('available_stock', listing['results'][0])
+
+    def test_cart_responses_include_it(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.client.force_authenticate(user)
+        self.client.post('/api/cart/add/', {'product': self.product.id, 'quantity': 2})
+        self.assertEqual(self.client.get('/api/cart/').data[0]['product']['available_stock'], 3)
+
+
+class PurgeTrashTests(TestCase):
+    def trash(self, name, days_ago):
+        product = Product.objects.create(name=name, price='10.00', stock=1)
+        product.soft_delete()
+        Product.all_objects.filter(pk=product.pk).update(deleted_at=timezone.now() - timedelta(days=days_ago))
+        return product
+
+    def test_purges_expired_unordered_products_only(self):
+        old = self.trash('Old', 40)
+        recent = self.trash('Recent', 5)
+        ordered = self.trash('Ordered', 40)
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        order = Order.objects.create(user=user, total='10.00', address='Somewhere')
+        OrderItem.objects.create(order=order, product=ordered, quantity=1, price='10.00')
+
+        result = purge_trashed_products(retention_days=30, batch_size=1, pause=0)
+        self.assertEqual((result['purged'], result['kept_ordered']), (1, 1))
+        self.assertEqual(set(Product.all_objects.values_list('pk', flat=True)), {recent.pk, ordered.pk})
+        self.assertFalse(Product.all_objects.filter(pk=old.pk).exists())
+        self.assertEqual(OrderItem.objects.get().product_id, ordered.pk)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        Product.objects.create(name='Alloy Wheel', brand='Zoom', price='99.00')
+        Product.objects.create(name='Air Horn', brand='Acme', price='5.00')
+        self.index = AutocompleteIndex()
+        self.index.load()
+
+    def texts(self, query):
+        return [s['text'] for s in self.index.suggest(query)]
+
+    def test_prefix_and_typo_matches(self):
+        self.assertEqual(self.texts('whe'), ['Alloy Wheel'])
+        self.assertEqual(self.texts('acm'), ['Acme'])
+        self.assertEqual(self.texts('alloi whe'), ['Alloy Wheel'])
+
+    def test_bulk_load_matches_incremental_index(self):
+        incremental = AutocompleteIndex()
+        for pk, name, brand in Product.objects.values_list('id', 'name', 'brand'):
+            incremental._add_product(pk, name, brand)
+        self.assertEqual(self.index._prefixes, incremental._prefixes)
+
+    def test_only_name_changes_bump_names_version(self):
+        product = Product.objects.get(name='Air Horn')
+        version = get_names_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            product.stock = 3
+            product.save(update_fields=['stock'])
+        self.assertEqual(get_names_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Air Horn Pro'
+            product.save()
+            self.assertEqual(get_names_version(), version)
+        self.assertNotEqual(get_names_version(), version)
+
+    def test_other_workers_changes_are_not_absorbed(self):
+        other = AutocompleteIndex()
+        other.load()
+        alloy = Product.objects.get(name='Alloy Wheel')
+        horn = Product.objects.get(name='Air Horn')
+
+        # This worker renames a product...
+        Product.objects.filter(pk=alloy.pk).update(name='Gamma Wheel')
+        alloy.name = 'Gamma Wheel'
+        self.index.update_product(alloy, bump_names_version())
+        self.assertEqual(self.index._version, get_names_version())
+        # ...then the other one saves an unrelated product
+        other.update_product(horn, bump_names_version())
+        self.assertNotEqual(other._version, get_names_version())
+
+        with mock.patch.object(other, '_reload_in_background') as reload:
+            other.suggest('air')
+        reload.assert_called_once()
+        other.load()
+        self.assertEqual([s['text'] for s in other.suggest('gam')], ['Gamma Wheel'])
+
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        self.index.invalidate()
+        with mock.patch.object(self.index, 'load') as load, \
+                mock.patch.object(self.index, '_reload_in_background') as reload:
+            self.assertEqual(self.texts('whe'), ['Alloy Wheel'])
+        load.assert_not_called()
+        reload.assert_called_once()
@@ -1,16 +1,30 @@
 from django.urls import path
 from .views import (
     ProductListCreateAPIView,
+    ProductSearchAPIView,
+    ProductAutocompleteAPIView,
     ProductDetailAPIView,
+    ProductBoughtTogetherAPIView,
     ProductTrashListAPIView,
     ProductRestoreAPIView,
-    ProductPermanentDeleteAPIView
+    ProductPermanentDeleteAPIView,
+    ProductCacheStatsAPIView,
+    ProductImportAPIView,
+    ProductExportAPIView,
+    ProductBulkAdjustAPIView,
 )
 
 urlpatterns = [
     path('products/', ProductListCreateAPIView.as_view(), name='product-list'),
+    path('products/search/', ProductSearchAPIView.as_view(), name='product-search'),
+    path('products/autocomplete/', ProductAutocompleteAPIView.as_view(), name='product-autocomplete'),
+    path('products/import/', ProductImportAPIView.as_view(), name='product-import'),
+    path('products/export/', ProductExportAPIView.as_view(), name='product-export'),
+    path('products/bulk-adjust/', ProductBulkAdjustAPIView.as_view(), name='product-bulk-adjust'),
     path('products/<int:pk>/', ProductDetailAPIView.as_view(), name='product-detail'),
+    path('products/<int:pk>/bought-together/', ProductBoughtTogetherAPIView.as_view(), name='product-bought-together'),
     path('products/trash/', ProductTrashListAPIView.as_view(), name='product-trash'),
     path('products/<int:pk>/restore/', ProductRestoreAPIView.as_view(), name='product-restore'),
     path('products/<int:pk>/permanent/', ProductPermanentDeleteAPIView.as_view(), name='product-permanent-delete'),
+    path('products/cache-stats/', ProductCacheStatsAPIView.as_view(), name='product-cache-stats'),
 ]
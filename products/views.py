@@ -1,11 +1,30 @@
 # products/views.py
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAdminUser
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.static import serve
+from . import cache as catalog_cache
+from . import fastpath
+from .bulk import FORMATS, PriceOutOfRange, ProductImporter, bulk_adjust, export_rows, guess_format, read_rows
+from .autocomplete import DEFAULT_LIMIT, MAX_LIMIT, autocomplete_index
+from .conditional import (
+    catalog_validators, not_modified_response, product_validators, set_validators
+)
+from .copurchase import DEFAULT_TOP_K, bought_together
+from .filters import facet_counts, filter_products, wants_facets
+from .includes import latest_reviews, parse_includes, related_products, wishlist_status
 from .models import Product
-from .serializers import ProductSerializer
+from .pagination import ProductCursorPagination, SearchPagination
+from .search import search_products
+from .serializers import BulkAdjustSerializer, ProductSerializer
+from .sparse import fields_from_request, sparse_queryset
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
 
 class ProductListCreateAPIView(APIView):
     def get_permissions(self):
@@ -14,10 +33,53 @@ class ProductListCreateAPIView(APIView):
         return [IsAdminUser()]
 
     def get(self, request):
-        """Get all active (non-deleted) products"""
-        products = Product.objects.filter(is_deleted=False).order_by('-created_at')
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        """Get active (non-deleted) products, one cursor page at a time"""
+        etag, last_modified = catalog_validators(request)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        if self.use_fast_path(request):
+            body = catalog_cache.get_or_build(
+                'product-list-json', request,
+                lambda: fastpath.dumps(self.get_page_data(request, fast=True))
+            )
+            response = HttpResponse(body, content_type='application/json')
+            return set_validators(response, etag, last_modified)
+
+        data = catalog_cache.get_or_build(
+            'product-list', request, lambda: self.get_page_data(request)
+        )
+        return set_validators(Response(data), etag, last_modified)
+
+    def use_fast_path(self, request):
+        """Plain, unindented JSON can skip ProductSerializer and JSONRenderer"""
+        return (
+            settings.PRODUCT_LIST_FAST_PATH
+            and request.accepted_renderer.format == 'json'
+            and 'indent' not in request.accepted_media_type
+            and fastpath.supported()
+        )
+
+    def get_page_data(self, request, fast=False):
+        catalog = Product.objects.all()
+        products = filter_products(catalog, request.query_params)
+        fields = fields_from_request(request)
+        paginator = ProductCursorPagination()
+        if fast:
+            columns, map_rows = fastpath.row_mapper(fields)
+            page = paginator.paginate_queryset(products.values_list(*columns), request, view=self)
+            results = map_rows(page)
+        else:
+            page = paginator.paginate_queryset(
+                # The cursor is built from created_at, so always load it
+                sparse_queryset(products, ProductSerializer, fields, 'created_at'), request, view=self
+            )
+            results = ProductSerializer(page, many=True, fields=fields).data
+        data = paginator.get_paginated_response(results).data
+        if wants_facets(request.query_params):
+            data['facets'] = facet_counts(catalog, request.query_params)
+        return data
 
     def post(self, request):
         """Create a new product (admin only)"""
@@ -28,6 +90,47 @@ class ProductListCreateAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ProductSearchAPIView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """Full-text search over name, brand and description, best match first"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"detail": "Search query 'q' is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        data = catalog_cache.get_or_build(
+            'product-search', request, lambda: self.get_page_data(request, query)
+        )
+        return Response(data)
+
+    def get_page_data(self, request, query):
+        products = filter_products(Product.objects.all(), request.query_params)
+        fields = fields_from_request(request)
+        products = sparse_queryset(products, ProductSerializer, fields)
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(search_products(products, query), request, view=self)
+        serializer = ProductSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data).data
+
+
+class ProductAutocompleteAPIView(APIView):
+    permission_classes = [AllowAny]
+    # Skip token lookups too: suggestions are answered purely from memory
+    authentication_classes = []
+
+    def get(self, request):
+        """Name and brand suggestions for the search box"""
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        suggestions = autocomplete_index.suggest(request.query_params.get('q', ''), max(limit, 1))
+        return Response({"results": suggestions})
+
+
 class ProductDetailAPIView(APIView):
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -36,20 +139,65 @@ class ProductDetailAPIView(APIView):
 
     def get_object(self, pk):
         try:
-            return Product.objects.get(pk=pk, is_deleted=False)
+            return Product.objects.get(pk=pk)
         except Product.DoesNotExist:
             return None
 
     def get(self, request, pk):
-        """Get single product details"""
-        product = self.get_object(pk)
-        if not product:
+        """
+        Get single product details. `?include=reviews,related,wishlist_status`
+        embeds the latest reviews, related products and whether the current
+        user has wishlisted the product.
+        """
+        includes = parse_includes(request.query_params)
+        in_wishlist = None
+        extra = []
+        if 'related' in includes:
+            # Related products change without touching this product
+            extra.append(catalog_cache.get_catalog_version())
+        if 'wishlist_status' in includes:
+            in_wishlist = wishlist_status(request.user, pk)
+            extra += [request.user.pk, in_wishlist]
+
+        etag, last_modified = product_validators(pk, *extra)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        data = catalog_cache.get_or_build(
+            f'product-detail:{pk}', request,
+            lambda: self.get_product_data(request, pk, includes)
+        )
+        if data is None:
             return Response(
                 {"detail": "Product not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
-        serializer = ProductSerializer(product)
-        return Response(serializer.data)
+        if in_wishlist is None:
+            return set_validators(Response(data), etag, last_modified)
+
+        # Per-user, so never part of the shared cache entry
+        response = Response(dict(data, in_wishlist=in_wishlist))
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ['Authorization'])
+        return set_validators(response, etag, last_modified)
+
+    def get_product_data(self, request, pk, includes=()):
+        fields = fields_from_request(request)
+        products = Product.objects.filter(pk=pk)
+        if 'related' in includes:
+            products = sparse_queryset(products, ProductSerializer, fields, 'category')
+        else:
+            products = sparse_queryset(products, ProductSerializer, fields)
+        product = products.first()
+        if not product:
+            return None
+        data = ProductSerializer(product, fields=fields).data
+        if 'reviews' in includes:
+            data['reviews'] = latest_reviews(product)
+        if 'related' in includes:
+            data['related'] = related_products(product, fields)
+        return data
 
     def put(self, request, pk):
         """Update product (admin only)"""
@@ -97,12 +245,34 @@ class ProductDetailAPIView(APIView):
             )
 
 
+class ProductBoughtTogetherAPIView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, pk):
+        """Products frequently bought together with this one, best first"""
+        data = catalog_cache.get_or_build(
+            f'product-bought-together:{pk}', request,
+            lambda: self.get_results(request, pk)
+        )
+        return Response(data)
+
+    def get_results(self, request, pk):
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_TOP_K)), DEFAULT_TOP_K)
+        except ValueError:
+            limit = DEFAULT_TOP_K
+        fields = fields_from_request(request)
+        live = sparse_queryset(Product.objects.all(), ProductSerializer, fields)
+        products = bought_together(pk, max(limit, 1), queryset=live)
+        return {"results": ProductSerializer(products, many=True, fields=fields).data}
+
+
 class ProductTrashListAPIView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request):
         """Get all trashed products (admin only)"""
-        products = Product.objects.filter(is_deleted=True).order_by('-deleted_at')
+        products = Product.trashed.order_by('-deleted_at')
         serializer = ProductSerializer(products, many=True)
         return Response(serializer.data)
 
@@ -113,7 +283,7 @@ class ProductRestoreAPIView(APIView):
     def post(self, request, pk):
         """Restore product from trash (admin only)"""
         try:
-            product = Product.objects.get(pk=pk, is_deleted=True)
+            product = Product.trashed.get(pk=pk)
             product.restore()
             serializer = ProductSerializer(product)
             return Response({
@@ -133,7 +303,7 @@ class ProductPermanentDeleteAPIView(APIView):
     def delete(self, request, pk):
         """Permanently delete product from database (admin only)"""
         try:
-            product = Product.objects.get(pk=pk, is_deleted=True)
+            product = Product.trashed.get(pk=pk)
             product_name = product.name
             product.delete()
             return Response(
@@ -144,4 +314,91 @@ class ProductPermanentDeleteAPIView(APIView):
             return Response(
                 {"detail": "Product not found in trash"}, 
                 status=status.HTTP_404_NOT_FOUND
-            )
\ No newline at end of file
+            )
+
+
+class ProductCacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Catalog cache version and hit/miss counters (admin only)"""
+        return Response(catalog_cache.get_cache_stats())
+
+
+
+class ProductImportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """
+        Bulk create/update products from CSV or NDJSON (admin only).
+        Send a multipart `file`, or the raw file as the request body.
+        """
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response(
+                    {"detail": "No file uploaded"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            stream, filename = upload, upload.name
+        else:
+            stream, filename = request.stream, None
+            if stream is None:
+                return Response(
+                    {"detail": "Request body is empty"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        file_format = request.query_params.get('file_format') or guess_format(filename, request.content_type)
+        if file_format not in FORMATS:
+            return Response(
+                {"detail": f"Unsupported format '{file_format}'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        importer = ProductImporter()
+        report = importer.run(read_rows(stream, file_format))
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class ProductExportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Stream all active products as CSV or NDJSON (admin only)"""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in FORMATS:
+            return Response(
+                {"detail": f"Unsupported format '{file_format}'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        content_type = 'application/x-ndjson' if file_format == 'ndjson' else 'text/csv'
+        response = StreamingHttpResponse(export_rows(file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
+
+
+class ProductBulkAdjustAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        """Set-based stock/price adjustment for many products at once (admin only)"""
+        serializer = BulkAdjustSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = bulk_adjust(**serializer.validated_data)
+        except PriceOutOfRange as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """Development media view; content-addressed files never change, so cache them forever"""
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.cache import bump_catalog_version
+from products.models import Product
+from reviews.signals import review_stats_update_kwargs
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Product.rating and Product.review_count from the reviews table'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Product.all_objects.update(**review_stats_update_kwargs())
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt review stats for {updated} products'))
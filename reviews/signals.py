@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models import Avg, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from products.cache import bump_catalog_version
+from products.models import Product
+from .models import Review
+
+
+def review_stats_update_kwargs():
+    """Column updates that recompute Product.rating/review_count from reviews"""
+    reviews = Review.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+    return {
+        'review_count': Coalesce(
+            Subquery(reviews.annotate(n=Count('id')).values('n')), Value(0)
+        ),
+        'rating': Coalesce(
+            Subquery(reviews.annotate(avg=Round(Avg('rating'), 1)).values('avg')), Value(0.0)
+        ),
+        'updated_at': timezone.now(),
+    }
+
+
+def refresh_review_stats(product_id):
+    """
+    Recompute the denormalized review aggregates of one product in a single
+    UPDATE. The product row is locked first: under READ COMMITTED the
+    UPDATE's subqueries would otherwise use a snapshot taken before it
+    waited for a concurrent review's transaction, and write an aggregate
+    missing that review. After the lock the UPDATE sees every committed review.
+    """
+    products = Product.all_objects.filter(pk=product_id)
+    with transaction.atomic():
+        list(products.select_for_update().values_list('pk'))
+        products.update(**review_stats_update_kwargs())
+    # update() skips Product signals, so invalidate cached catalog pages here,
+    # once the new aggregates are visible to other connections
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    refresh_review_stats(instance.product_id)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    refresh_review_stats(instance.product_id)
@@ -1,3 +1,64 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import QuerySet
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from products.cache import get_catalog_version
+from products.models import Product
+from .models import Review
+
+User = get_user_model()
+
+
+class ReviewStatsTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.users = [
+            User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='pw') for i in range(3)
+        ]
+
+    def stats(self):
+        self.product.refresh_from_db()
+        return self.product.rating, self.product.review_count
+
+    def test_reviews_update_aggregates(self):
+        client = APIClient()
+        for user, rating in zip(self.users, [5, 4, 4]):
+            client.force_authenticate(user)
+            response = client.post('/api/reviews/', {'product': self.product.id, 'rating': rating, 'comment': 'ok'})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stats(), (Decimal('4.3'), 3))
+
+        Review.objects.filter(rating=5).delete()
+        Review.objects.get(user=self.users[1]).delete()
+        self.assertEqual(self.stats(), (Decimal('4.0'), 1))
+        Review.objects.get().delete()
+        self.assertEqual(self.stats(), (Decimal('0.0'), 0))
+
+    def test_recompute_locks_the_product_row(self):
+        # SQLite has no FOR UPDATE, so check the lock is requested
+        lock = mock.patch.object(
+            QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update
+        )
+        with lock as select_for_update:
+            Review.objects.create(product=self.product, user=self.users[0], rating=3)
+        self.assertEqual(select_for_update.call_args.args[0].model, Product)
+
+    def test_catalog_version_is_bumped_after_commit(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Review.objects.create(product=self.product, user=self.users[0], rating=3)
+                self.assertEqual(get_catalog_version(), version)
+        self.assertNotEqual(get_catalog_version(), version)
 
-# Create your tests here.
+    def test_rebuild_command(self):
+        Review.objects.create(product=self.product, user=self.users[0], rating=2)
+        Product.all_objects.update(rating=0, review_count=0)
+        call_command('rebuild_review_stats', stdout=mock.Mock())
+        self.assertEqual(self.stats(), (Decimal('2.0'), 1))
@@ -1,6 +1,7 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
+from django.db import transaction
 from .models import Review
 from .serializers import ReviewSerializer
 
@@ -16,7 +17,9 @@ class ReviewListCreateView(generics.ListCreateAPIView):
         return Review.objects.all().order_by('-created_at')
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # The review and the product's rating/review_count change together
+        with transaction.atomic():
+            serializer.save(user=self.request.user)
 
 
 #  Delete Review (only owner or admin)
@@ -31,7 +34,8 @@ class ReviewDeleteView(generics.DestroyAPIView):
 
         #  Allow only owner or admin
         if user.is_staff or review.user == user:
-            review.delete()
+            with transaction.atomic():
+                review.delete()
             return Response(
                 {"message": "Review deleted successfully"},
                 status=status.HTTP_204_NO_CONTENT
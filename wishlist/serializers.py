@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from .models import Wishlist
 from products.serializers import ProductSerializer
+from products.sparse import SparseFieldsMixin
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
     class Meta:
@@ -1,3 +1,26 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from products.models import Product
+from .models import Wishlist
+
+User = get_user_model()
+
+
+class WishlistSparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pw')
+        self.product = Product.objects.create(name='Wheel', price='99.00', stock=5)
+        self.item = Wishlist.objects.create(user=self.user, product=self.product)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fields_without_product(self):
+        response = self.client.get('/api/wishlist/wishlist/', {'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{'id': self.item.id}])
+
+    def test_nested_product_fields(self):
+        response = self.client.get('/api/wishlist/wishlist/', {'fields': 'id,product.name'})
+        self.assertEqual(response.data, [{'id': self.item.id, 'product': {'name': 'Wheel'}}])
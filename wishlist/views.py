@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from .models import Wishlist
 from .serializers import WishlistSerializer
 from products.models import Product
+from products.sparse import fields_from_request, sparse_queryset
 
 
 # 1. Add/Remove (Toggle) Wishlist
@@ -42,8 +43,10 @@ class WishlistListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        fields = fields_from_request(request)
         wishlist = Wishlist.objects.filter(user=request.user).select_related('product')
-        serializer = WishlistSerializer(wishlist, many=True)
+        wishlist = sparse_queryset(wishlist, WishlistSerializer, fields)
+        serializer = WishlistSerializer(wishlist, many=True, fields=fields)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 